@@ -1,18 +1,7 @@
-import pyodbc
+from insighted_db import get_mssql_engine
 
-# Connect to database
-conn_str = (
-    "Driver={ODBC Driver 18 for SQL Server};"
-    "Server=tcp:insighted.database.windows.net,1433;"
-    "Database=insighted;"
-    "Uid=CloudSAe7c5cc04@insighted;"
-    "Pwd=P@ssw0rd123;"
-    "Encrypt=yes;"
-    "TrustServerCertificate=no;"
-    "Connection Timeout=30;"
-)
-
-conn = pyodbc.connect(conn_str)
+# Connect to database (INSIGHTED_MSSQL_ODBC holds the ODBC connection string)
+conn = get_mssql_engine().raw_connection()
 cursor = conn.cursor()
 
 # Check school_summary table
@@ -0,0 +1,413 @@
+
+import os
+import sys
+import json
+import hashlib
+import argparse
+from sqlalchemy import create_engine, event, inspect, text
+from sqlalchemy import types as sqltypes
+
+# Checksum-based table diff between two databases (e.g. the PostgreSQL pipeline
+# database and the Azure SQL Server copy).
+# Each side hashes its own rows and returns only per-range (count, checksum)
+# pairs. Ranges that agree are done; ranges that differ are split into smaller
+# key ranges and compared again (Merkle-style), down to small leaves where the
+# per-row hashes are fetched. Only checksums and leaf hashes cross the network.
+#
+# Values are normalised per type before hashing so that PostgreSQL, SQL Server
+# and SQLite produce the same text for the same row:
+#   integers -> plain digits, booleans -> 0/1, decimals/floats -> 6 decimals,
+#   timestamps -> 'YYYY-MM-DD HH:MM:SS', NULL -> \N
+
+DEFAULT_TABLES = ['school_summary', 'school_profiles']
+DEFAULT_KEY = 'school_id'
+# Set at write time, so it legitimately differs between copies
+DEFAULT_EXCLUDE = ['last_updated']
+
+FANOUT = 16
+LEAF_ROWS = 64
+MAX_DEPTH = 12
+NULL_MARKER = '\\N'
+SEPARATOR = '|'
+
+# --- PER-DIALECT SQL ---
+
+def _sqlite_md5(value):
+    return None if value is None else hashlib.md5(value.encode('utf-8')).hexdigest()
+
+def _sqlite_hash32(value):
+    return None if value is None else int(hashlib.md5(value.encode('utf-8')).hexdigest()[:8], 16)
+
+def prepare_engine(engine):
+    """SQLite has no md5(); register the same functions the other dialects have built in."""
+    if engine.dialect.name == 'sqlite':
+        @event.listens_for(engine, 'connect')
+        def _register(dbapi_conn, _):
+            dbapi_conn.create_function('md5', 1, _sqlite_md5, deterministic=True)
+            dbapi_conn.create_function('hash32', 1, _sqlite_hash32, deterministic=True)
+    return engine
+
+def quote(engine, name):
+    return engine.dialect.identifier_preparer.quote(name)
+
+def type_class(sa_type):
+    if isinstance(sa_type, sqltypes.Boolean):
+        return 'bool'
+    if isinstance(sa_type, sqltypes.Integer):
+        return 'int'
+    if isinstance(sa_type, (sqltypes.Numeric, sqltypes.Float)):
+        return 'decimal'
+    if isinstance(sa_type, sqltypes.DateTime):
+        return 'timestamp'
+    if isinstance(sa_type, sqltypes.Date):
+        return 'date'
+    return 'text'
+
+def normalized_value(dialect, col, kind):
+    """SQL expression turning one column into its canonical text (NULL kept as NULL)."""
+    if dialect == 'postgresql':
+        return {
+            'bool': f"CASE WHEN {col} THEN '1' ELSE '0' END",
+            'int': f"CAST(CAST({col} AS BIGINT) AS TEXT)",
+            'decimal': f"CAST(CAST({col} AS NUMERIC(38,6)) AS TEXT)",
+            'timestamp': f"to_char({col}, 'YYYY-MM-DD HH24:MI:SS')",
+            'date': f"to_char({col}, 'YYYY-MM-DD')",
+        }.get(kind, f"CAST({col} AS TEXT)")
+    if dialect == 'mssql':
+        return {
+            'bool': f"CAST(CAST({col} AS INT) AS NVARCHAR(1))",
+            'int': f"CAST(CAST({col} AS BIGINT) AS NVARCHAR(40))",
+            'decimal': f"CAST(CAST({col} AS DECIMAL(38,6)) AS NVARCHAR(64))",
+            'timestamp': f"CONVERT(NVARCHAR(19), {col}, 120)",
+            'date': f"CONVERT(NVARCHAR(10), {col}, 23)",
+        }.get(kind, f"CAST({col} AS NVARCHAR(MAX))")
+    if dialect == 'sqlite':
+        return {
+            'bool': f"CAST(CAST({col} AS INTEGER) AS TEXT)",
+            'int': f"CAST(CAST({col} AS INTEGER) AS TEXT)",
+            'decimal': f"printf('%.6f', {col})",
+            'timestamp': f"substr(CAST({col} AS TEXT), 1, 19)",
+            'date': f"substr(CAST({col} AS TEXT), 1, 10)",
+        }.get(kind, f"CAST({col} AS TEXT)")
+    raise ValueError(f"Unsupported dialect: {dialect}")
+
+def row_text_expr(engine, columns):
+    dialect = engine.dialect.name
+    parts = [f"COALESCE({normalized_value(dialect, quote(engine, name), kind)}, '{NULL_MARKER}')" for name, kind in columns]
+    if dialect == 'mssql':
+        return f" + N'{SEPARATOR}' + ".join(parts)
+    return f" || '{SEPARATOR}' || ".join(parts)
+
+def row_hash_exprs(engine, columns):
+    """(md5 hex of the row, first 32 bits of that md5 as a non-negative integer)"""
+    row_text = row_text_expr(engine, columns)
+    dialect = engine.dialect.name
+    if dialect == 'postgresql':
+        return (f"md5({row_text})",
+                f"('x' || lpad(substr(md5({row_text}), 1, 8), 16, '0'))::bit(64)::bigint")
+    if dialect == 'mssql':
+        # UTF-8 bytes, like the other dialects (requires SQL Server 2019+ / Azure SQL)
+        digest = f"HASHBYTES('MD5', CAST(({row_text}) COLLATE Latin1_General_100_CI_AS_SC_UTF8 AS VARCHAR(MAX)))"
+        return (f"LOWER(CONVERT(VARCHAR(32), {digest}, 2))",
+                f"CAST(CONVERT(BINARY(4), {digest}) AS BIGINT)")
+    return (f"md5({row_text})", f"hash32({row_text})")
+
+# --- ONE SIDE OF THE COMPARISON ---
+
+class TableSide:
+    def __init__(self, name, engine, table, key, columns):
+        self.name = name
+        self.engine = engine
+        self.table = quote(engine, table)
+        self.key = quote(engine, key)
+        self.row_md5, self.row_hash32 = row_hash_exprs(engine, columns)
+        self.queries = 0
+        self.rows_fetched = 0
+        self.bytes_fetched = 0
+
+    def _fetch(self, sql, params):
+        with self.engine.connect() as conn:
+            rows = conn.execute(text(sql), params).fetchall()
+        self.queries += 1
+        self.rows_fetched += len(rows)
+        self.bytes_fetched += sum(len(str(v)) for row in rows for v in row)
+        return rows
+
+    def _range_where(self, lo, hi, params):
+        clauses = []
+        if lo is not None:
+            clauses.append(f"{self.key} > :lo")
+            params['lo'] = lo
+        if hi is not None:
+            clauses.append(f"{self.key} <= :hi")
+            params['hi'] = hi
+        return ("WHERE " + " AND ".join(clauses)) if clauses else ""
+
+    def checksums(self, lo, hi, bounds):
+        """{bucket: (count, checksum)} for the sub-ranges of (lo, hi] split at bounds."""
+        params = {}
+        where = self._range_where(lo, hi, params)
+        if bounds:
+            whens = []
+            for i, b in enumerate(bounds):
+                params[f'b{i}'] = b
+                whens.append(f"WHEN {self.key} <= :b{i} THEN {i}")
+            bucket = f"CASE {' '.join(whens)} ELSE {len(bounds)} END"
+        else:
+            bucket = "0"
+        sql = f"""
+            SELECT bucket, COUNT(*), SUM(hv) FROM (
+                SELECT {bucket} AS bucket, {self.row_hash32} AS hv FROM {self.table} {where}
+            ) x GROUP BY bucket
+        """
+        return {int(b): (int(n), int(h or 0)) for b, n, h in self._fetch(sql, params)}
+
+    def split_points(self, lo, hi, parts):
+        """Keys splitting (lo, hi] into ~equal-sized parts on this side."""
+        params = {'parts': parts}
+        where = self._range_where(lo, hi, params)
+        sql = f"""
+            SELECT MAX(k) FROM (
+                SELECT {self.key} AS k, NTILE(:parts) OVER (ORDER BY {self.key}) AS tile FROM {self.table} {where}
+            ) x GROUP BY tile ORDER BY 1
+        """
+        keys = [r[0] for r in self._fetch(sql, params)]
+        return keys[:-1]
+
+    def row_hashes(self, lo, hi):
+        params = {}
+        where = self._range_where(lo, hi, params)
+        sql = f"SELECT {self.key}, {self.row_md5} FROM {self.table} {where}"
+        return {str(k): h for k, h in self._fetch(sql, params)}
+
+# --- COMPARISON ---
+
+def compare_columns(engine_a, engine_b, table, key, exclude):
+    cols_a = {c['name']: c for c in inspect(engine_a).get_columns(table)}
+    cols_b = {c['name'] for c in inspect(engine_b).get_columns(table)}
+    if key not in cols_a or key not in cols_b:
+        raise ValueError(f"Key column {key} missing from {table} on one side")
+
+    skipped = sorted((set(cols_a) ^ cols_b) - set(exclude))
+    columns = [(name, type_class(c['type'])) for name, c in cols_a.items()
+               if name in cols_b and name not in exclude]
+    return columns, skipped
+
+def diff_table(engine_a, engine_b, table, key=DEFAULT_KEY, exclude=DEFAULT_EXCLUDE,
+               fanout=FANOUT, leaf_rows=LEAF_ROWS, max_depth=MAX_DEPTH):
+    columns, skipped = compare_columns(engine_a, engine_b, table, key, exclude)
+    side_a = TableSide('a', engine_a, table, key, columns)
+    side_b = TableSide('b', engine_b, table, key, columns)
+
+    leaves_a, leaves_b = {}, {}
+    ranges_compared = 0
+
+    def walk(lo, hi, sums_a, sums_b, depth):
+        nonlocal ranges_compared
+        ranges_compared += 1
+        if sums_a == sums_b:
+            return
+
+        rows = max(sums_a[0], sums_b[0])
+        if rows <= leaf_rows or depth >= max_depth:
+            leaves_a.update(side_a.row_hashes(lo, hi))
+            leaves_b.update(side_b.row_hashes(lo, hi))
+            return
+
+        # Split on whichever side has more rows in this range
+        splitter = side_a if sums_a[0] >= sums_b[0] else side_b
+        bounds = splitter.split_points(lo, hi, fanout)
+        if not bounds:
+            leaves_a.update(side_a.row_hashes(lo, hi))
+            leaves_b.update(side_b.row_hashes(lo, hi))
+            return
+
+        sub_a = side_a.checksums(lo, hi, bounds)
+        sub_b = side_b.checksums(lo, hi, bounds)
+        edges = [lo] + bounds + [hi]
+        for i in range(len(bounds) + 1):
+            walk(edges[i], edges[i + 1], sub_a.get(i, (0, 0)), sub_b.get(i, (0, 0)), depth + 1)
+
+    total_a = side_a.checksums(None, None, []).get(0, (0, 0))
+    total_b = side_b.checksums(None, None, []).get(0, (0, 0))
+    walk(None, None, total_a, total_b, 0)
+
+    # Leaves are matched by key across all differing ranges, so a row that the
+    # two collations place in different ranges is still paired up correctly.
+    only_a = sorted(set(leaves_a) - set(leaves_b))
+    only_b = sorted(set(leaves_b) - set(leaves_a))
+    changed = sorted(k for k in set(leaves_a) & set(leaves_b) if leaves_a[k] != leaves_b[k])
+
+    return {
+        'table': table,
+        'key': key,
+        'rows_a': total_a[0],
+        'rows_b': total_b[0],
+        'columns_compared': [name for name, _ in columns],
+        'columns_skipped': skipped,
+        'only_in_a': only_a,
+        'only_in_b': only_b,
+        'changed': changed,
+        'ranges_compared': ranges_compared,
+        'queries': side_a.queries + side_b.queries,
+        'rows_transferred': side_a.rows_fetched + side_b.rows_fetched,
+        'bytes_transferred': side_a.bytes_fetched + side_b.bytes_fetched,
+    }
+
+def column_differences(engine_a, engine_b, table, key, keys, columns):
+    """Fetches just the changed rows from both sides and names the differing columns."""
+    def fetch(engine):
+        sql = f"SELECT * FROM {quote(engine, table)} WHERE {quote(engine, key)} IN ({', '.join(f':k{i}' for i in range(len(keys)))})"
+        with engine.connect() as conn:
+            rows = conn.execute(text(sql), {f'k{i}': k for i, k in enumerate(keys)}).mappings().fetchall()
+        return {str(r[key]): r for r in rows}
+
+    rows_a, rows_b = fetch(engine_a), fetch(engine_b)
+    out = {}
+    for k in keys:
+        a, b = rows_a.get(k), rows_b.get(k)
+        if a is None or b is None:
+            continue
+        out[k] = {c: {'a': a[c], 'b': b[c]} for c in columns if str(a[c]) != str(b[c])}
+    return out
+
+def print_report(result, details=None, limit=50):
+    print(f"\n=== {result['table']} (key {result['key']}) ===")
+    print(f"Rows: {result['rows_a']:,} (a) vs {result['rows_b']:,} (b); {len(result['columns_compared'])} columns compared")
+    if result['columns_skipped']:
+        print(f"Columns on one side only (not compared): {', '.join(result['columns_skipped'])}")
+    print(f"Compared {result['ranges_compared']} ranges in {result['queries']} queries, "
+          f"transferred {result['rows_transferred']:,} rows (~{result['bytes_transferred'] / 1024:.1f} KB)")
+
+    for label, keys in [('Only in a', result['only_in_a']), ('Only in b', result['only_in_b']), ('Changed', result['changed'])]:
+        print(f"{label}: {len(keys)}")
+        for k in keys[:limit]:
+            suffix = ""
+            if details and k in details:
+                suffix = "  " + ", ".join(f"{c}: {v['a']!r} -> {v['b']!r}" for c, v in details[k].items())
+            print(f"  {k}{suffix}")
+        if len(keys) > limit:
+            print(f"  ... and {len(keys) - limit} more")
+
+# --- ENGINES ---
+
+def engine_from_arg(value, default_side):
+    if value:
+        if value.startswith(('postgres://', 'postgresql')):
+            from insighted_db import make_engine, normalize_url
+            return prepare_engine(make_engine(normalize_url(value)))
+        return prepare_engine(create_engine(value))
+
+    import insighted_db
+    if default_side == 'a':
+        return prepare_engine(insighted_db.get_engine(readonly=True))
+    return prepare_engine(insighted_db.get_mssql_engine())
+
+# --- LOCAL SELF-TEST ---
+
+def self_test(rows=5000):
+    """Two SQLite stand-ins with known differences; the diff must find exactly those."""
+    import random
+    import tempfile
+    from datetime import datetime, timedelta
+
+    with tempfile.TemporaryDirectory() as tmp:
+        engines = [prepare_engine(create_engine(f"sqlite:///{os.path.join(tmp, name)}.db")) for name in ('a', 'b')]
+        ddl = """
+            CREATE TABLE school_summary (
+                school_id VARCHAR(50) PRIMARY KEY, school_name TEXT, total_learners INTEGER,
+                data_health_score FLOAT, flag_exp_mismatch BOOLEAN, last_updated TIMESTAMP
+            )
+        """
+        rng = random.Random(7)
+        base = datetime(2026, 1, 1)
+        data = [{
+            'school_id': str(100000 + i), 'school_name': f"School {i}", 'total_learners': rng.randint(0, 3000),
+            'data_health_score': rng.choice([100.0, 99.0, 85.0, 40.5]), 'flag_exp_mismatch': rng.random() < 0.1,
+            'last_updated': base + timedelta(minutes=i)
+        } for i in range(rows)]
+
+        changed = {str(100000 + i) for i in rng.sample(range(rows), 7)}
+        removed = {str(100000 + i) for i in rng.sample(range(rows), 3)} - changed
+        added = {'999998', '999999'}
+
+        insert = text("""
+            INSERT INTO school_summary VALUES
+            (:school_id, :school_name, :total_learners, :data_health_score, :flag_exp_mismatch, :last_updated)
+        """)
+        with engines[0].begin() as conn:
+            conn.execute(text(ddl))
+            conn.execute(insert, data)
+        copy = []
+        for row in data:
+            if row['school_id'] in removed:
+                continue
+            row = dict(row, last_updated=row['last_updated'] + timedelta(days=1))
+            if row['school_id'] in changed:
+                row['data_health_score'] += 0.5
+            copy.append(row)
+        copy += [dict(data[0], school_id=k) for k in added]
+        with engines[1].begin() as conn:
+            conn.execute(text(ddl))
+            conn.execute(insert, copy)
+
+        result = diff_table(engines[0], engines[1], 'school_summary', leaf_rows=16)
+        print_report(result)
+        ok = (set(result['changed']) == changed and set(result['only_in_a']) == removed
+              and set(result['only_in_b']) == added)
+        print(f"\nSelf-test {'passed' if ok else 'FAILED'}.")
+        for engine in engines:
+            engine.dispose()
+        return ok
+
+def main():
+    parser = argparse.ArgumentParser(description='Compare tables across two databases with range checksums')
+    parser.add_argument('--a', type=str, help='Side a URL (default: primary PostgreSQL from insighted_db)')
+    parser.add_argument('--b', type=str, help='Side b URL (default: Azure SQL copy, INSIGHTED_MSSQL_ODBC)')
+    parser.add_argument('--tables', nargs='+', default=DEFAULT_TABLES, help='Tables to compare')
+    parser.add_argument('--key', type=str, default=DEFAULT_KEY, help='Key column shared by the tables')
+    parser.add_argument('--exclude', nargs='*', default=DEFAULT_EXCLUDE, help='Columns to leave out of the checksum')
+    parser.add_argument('--fanout', type=int, default=FANOUT, help='Sub-ranges per differing range')
+    parser.add_argument('--leaf-rows', type=int, default=LEAF_ROWS, help='Fetch row hashes once a range is this small')
+    parser.add_argument('--details', action='store_true', help='Fetch changed rows and show which columns differ')
+    parser.add_argument('--json', type=str, help='Also write the results as JSON to this path')
+    parser.add_argument('--self-test', action='store_true', help='Run against two generated SQLite databases')
+    args = parser.parse_args()
+
+    if args.self_test:
+        sys.exit(0 if self_test() else 1)
+
+    try:
+        engine_a = engine_from_arg(args.a, 'a')
+        engine_b = engine_from_arg(args.b, 'b')
+    except Exception as e:
+        print(f"Error connecting: {e}")
+        sys.exit(1)
+
+    results = []
+    in_sync = True
+    for table in args.tables:
+        try:
+            result = diff_table(engine_a, engine_b, table, args.key, args.exclude, args.fanout, args.leaf_rows)
+        except Exception as e:
+            print(f"Error comparing {table}: {e}")
+            in_sync = False
+            continue
+
+        details = None
+        if args.details and result['changed']:
+            details = column_differences(engine_a, engine_b, table, args.key, result['changed'][:200], result['columns_compared'])
+            result['column_differences'] = details
+        print_report(result, details)
+        results.append(result)
+        in_sync = in_sync and not (result['only_in_a'] or result['only_in_b'] or result['changed'])
+
+    if args.json:
+        with open(args.json, 'w', encoding='utf-8') as f:
+            json.dump(results, f, indent=2, default=str)
+        print(f"\nJSON written to {args.json}")
+
+    sys.exit(0 if in_sync else 2)
+
+if __name__ == "__main__":
+    main()
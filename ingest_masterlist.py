@@ -0,0 +1,349 @@
+
+import os
+import sys
+import json
+import hashlib
+import argparse
+from insighted_db import get_raw_connection
+
+TABLE_NAME = "masterlist_26_30"
+KEY_COLUMN = "Index"
+SCHEMA_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "masterlist_schema.json")
+DEFAULT_CACHE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), ".cache", "masterlist")
+
+# Excel headers map to the table columns by position (see headers.json)
+def load_masterlist_schema():
+    with open(SCHEMA_FILE, 'r', encoding='utf-8') as f:
+        return json.load(f)
+
+def file_sha256(path, chunk_size=1024 * 1024):
+    h = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(chunk_size), b''):
+            h.update(chunk)
+    return h.hexdigest()
+
+# --- VALUE COERCION ---
+# openpyxl returns ints/floats for ID columns (e.g. 502250), so normalize per target type
+
+def to_int(value):
+    if value is None or value == '':
+        return None
+    try:
+        return int(round(float(value)))
+    except (TypeError, ValueError):
+        return None
+
+def to_float(value):
+    if value is None or value == '':
+        return None
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return None
+
+def to_str(value):
+    if value is None:
+        return None
+    if isinstance(value, float) and value.is_integer():
+        value = int(value)
+    value = str(value).strip()
+    return value if value else None
+
+def arrow_schema(schema):
+    import pyarrow as pa
+
+    fields = []
+    for col in schema:
+        if col['data_type'] == 'integer':
+            fields.append(pa.field(col['column_name'], pa.int64()))
+        elif col['data_type'] == 'numeric':
+            fields.append(pa.field(col['column_name'], pa.float64()))
+        else:
+            fields.append(pa.field(col['column_name'], pa.string()))
+    return pa.schema(fields)
+
+def converters_for(schema):
+    converters = []
+    for col in schema:
+        if col['data_type'] == 'integer':
+            converters.append(to_int)
+        elif col['data_type'] == 'numeric':
+            converters.append(to_float)
+        else:
+            converters.append(to_str)
+    return converters
+
+# --- PHASE 1: XLSX -> PARQUET (cached by content hash) ---
+
+def convert_to_parquet(xlsx_path, parquet_path, schema, batch_size=5000):
+    """
+    Streams the workbook in read-only mode and writes it out batch by batch,
+    so only one batch of rows is ever held in memory.
+    """
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+    from openpyxl import load_workbook
+
+    print(f"Converting {os.path.basename(xlsx_path)} to Parquet (streaming, batch size {batch_size})...")
+
+    pa_schema = arrow_schema(schema)
+    converters = converters_for(schema)
+    n_cols = len(schema)
+
+    tmp_path = parquet_path + ".tmp"
+    wb = load_workbook(xlsx_path, read_only=True, data_only=True)
+    writer = None
+    total = 0
+
+    try:
+        ws = wb.active
+        writer = pq.ParquetWriter(tmp_path, pa_schema, compression='zstd')
+
+        columns = [[] for _ in range(n_cols)]
+        pending = 0
+
+        def flush():
+            batch = pa.RecordBatch.from_arrays(
+                [pa.array(values, type=field.type) for values, field in zip(columns, pa_schema)],
+                schema=pa_schema
+            )
+            writer.write_batch(batch)
+            for values in columns:
+                values.clear()
+
+        # Row 1 is the header row
+        for row in ws.iter_rows(min_row=2, values_only=True):
+            # Skip fully blank trailing rows that Excel likes to keep around
+            if row is None or all(v is None for v in row[:n_cols]):
+                continue
+
+            for i in range(n_cols):
+                value = row[i] if i < len(row) else None
+                columns[i].append(converters[i](value))
+
+            pending += 1
+            total += 1
+            if pending >= batch_size:
+                flush()
+                pending = 0
+                print(f"  ...{total} rows")
+
+        if pending:
+            flush()
+
+    finally:
+        if writer is not None:
+            writer.close()
+        wb.close()
+
+    os.replace(tmp_path, parquet_path)
+    print(f"Wrote {total} rows to {parquet_path}")
+    return total
+
+def get_cached_parquet(xlsx_path, cache_dir, schema, batch_size=5000, force=False):
+    os.makedirs(cache_dir, exist_ok=True)
+
+    print("Hashing workbook...")
+    digest = file_sha256(xlsx_path)
+    parquet_path = os.path.join(cache_dir, f"{TABLE_NAME}_{digest[:16]}.parquet")
+
+    if os.path.exists(parquet_path) and not force:
+        print(f"Cache hit ({digest[:16]}). Skipping Excel conversion.")
+    else:
+        convert_to_parquet(xlsx_path, parquet_path, schema, batch_size)
+
+    return parquet_path
+
+# --- PHASE 2: COPY INTO STAGING + HASH-JOIN RECONCILIATION ---
+
+def quote_ident(name):
+    return '"' + name.replace('"', '""') + '"'
+
+def create_table_sql(schema):
+    col_defs = []
+    for col in schema:
+        if col['data_type'] == 'character varying' and col.get('character_maximum_length'):
+            col_type = f"character varying({col['character_maximum_length']})"
+        else:
+            col_type = col['data_type']
+        col_defs.append(f"{quote_ident(col['column_name'])} {col_type}")
+    col_defs.append(f"PRIMARY KEY ({quote_ident(KEY_COLUMN)})")
+    return f"CREATE TABLE IF NOT EXISTS {TABLE_NAME} (\n    " + ",\n    ".join(col_defs) + "\n);"
+
+def copy_parquet_to_staging(raw_conn, parquet_path, staging_table, columns):
+    """Bulk loads the Parquet cache through COPY, one record batch at a time."""
+    import io
+    import pyarrow.csv as pacsv
+    import pyarrow.parquet as pq
+
+    col_list = ", ".join(quote_ident(c) for c in columns)
+    copy_sql = f"COPY {staging_table} ({col_list}) FROM STDIN WITH (FORMAT csv)"
+
+    parquet_file = pq.ParquetFile(parquet_path)
+    cur = raw_conn.cursor()
+    loaded = 0
+
+    for batch in parquet_file.iter_batches(batch_size=20000, columns=columns):
+        buf = io.BytesIO()
+        pacsv.write_csv(batch, buf, write_options=pacsv.WriteOptions(include_header=False))
+        buf.seek(0)
+        cur.copy_expert(copy_sql, buf)
+        loaded += batch.num_rows
+
+    cur.close()
+    return loaded
+
+def staging_key_problems(cur, staging_table, limit=20):
+    """
+    Staged rows whose key is blank or repeated (the target's primary key would
+    reject them), as (staged row, key, school_id, school_name, copies) tuples.
+    """
+    key = quote_ident(KEY_COLUMN)
+    cur.execute(f"""
+        SELECT s.staged_row, s.{key}, s.school_id, s.school_name, d.copies
+        FROM {staging_table} s
+        JOIN (
+            SELECT {key} AS k, COUNT(*) AS copies FROM {staging_table}
+            GROUP BY {key} HAVING {key} IS NULL OR COUNT(*) > 1
+        ) d ON s.{key} IS NOT DISTINCT FROM d.k
+        ORDER BY s.{key} NULLS FIRST, s.staged_row
+    """)
+    rows = cur.fetchall()
+    if rows:
+        print(f"Error: {len(rows)} staged row(s) have a blank or duplicate {KEY_COLUMN}:")
+        for staged_row, k, school_id, school_name, copies in rows[:limit]:
+            label = "blank" if k is None else f"{k} (x{copies})"
+            print(f"  row {staged_row}: {KEY_COLUMN} {label}  school_id {school_id}  {school_name}")
+        if len(rows) > limit:
+            print(f"  ...and {len(rows) - limit} more")
+    return rows
+
+def reconcile(xlsx_path, cache_dir=DEFAULT_CACHE_DIR, batch_size=5000, force=False, dry_run=False):
+    schema = load_masterlist_schema()
+    columns = [c['column_name'] for c in schema]
+
+    parquet_path = get_cached_parquet(xlsx_path, cache_dir, schema, batch_size, force)
+
+    print("Connecting to database...")
+    staging_table = "masterlist_staging"
+    key = quote_ident(KEY_COLUMN)
+    non_key = [c for c in columns if c != KEY_COLUMN]
+
+    # Row hash over the typed values. Both sides share the same column types;
+    # numerics are hashed as float8 so the display scale (14.50 vs 14.5, e.g.
+    # rows loaded by the old JS scripts) does not count as a change.
+    numeric_cols = {c['column_name'] for c in schema if c['data_type'] == 'numeric'}
+    def row_hash(alias):
+        values = [f"{alias}.{quote_ident(c)}" + ("::float8" if c in numeric_cols else "") for c in columns]
+        return f"md5(ROW({', '.join(values)})::text)"
+
+    raw_conn = get_raw_connection()
+    try:
+        cur = raw_conn.cursor()
+        cur.execute(create_table_sql(schema))
+        cur.execute(f"CREATE TEMP TABLE {staging_table} (LIKE {TABLE_NAME} INCLUDING DEFAULTS) ON COMMIT DROP")
+        # Let blank keys through COPY so they are reported with the duplicates below
+        cur.execute(f"ALTER TABLE {staging_table} ALTER COLUMN {key} DROP NOT NULL")
+        cur.execute(f"ALTER TABLE {staging_table} ADD COLUMN staged_row bigserial")
+        cur.close()
+
+        print("Copying Parquet cache into staging table...")
+        loaded = copy_parquet_to_staging(raw_conn, parquet_path, staging_table, columns)
+        print(f"Staged {loaded} rows.")
+
+        cur = raw_conn.cursor()
+        if staging_key_problems(cur, staging_table):
+            print("Fix the workbook and re-run; nothing was applied.")
+            raw_conn.rollback()
+            return None
+
+        cur.execute(f"ANALYZE {staging_table}")
+
+        # Materialize both hash sets once and let the planner hash-join them
+        cur.execute(f"""
+            CREATE TEMP TABLE staging_hashes ON COMMIT DROP AS
+            SELECT s.{key} AS k, {row_hash('s')} AS h FROM {staging_table} s
+        """)
+        cur.execute(f"""
+            CREATE TEMP TABLE target_hashes ON COMMIT DROP AS
+            SELECT t.{key} AS k, {row_hash('t')} AS h FROM {TABLE_NAME} t
+        """)
+        cur.execute("ANALYZE staging_hashes")
+        cur.execute("ANALYZE target_hashes")
+
+        cur.execute("""
+            CREATE TEMP TABLE masterlist_changes ON COMMIT DROP AS
+            SELECT COALESCE(s.k, t.k) AS k,
+                   CASE WHEN t.k IS NULL THEN 'new'
+                        WHEN s.k IS NULL THEN 'removed'
+                        ELSE 'changed' END AS change_type
+            FROM staging_hashes s
+            FULL OUTER JOIN target_hashes t ON s.k = t.k
+            WHERE t.k IS NULL OR s.k IS NULL OR s.h <> t.h
+        """)
+
+        cur.execute("SELECT change_type, COUNT(*) FROM masterlist_changes GROUP BY change_type")
+        counts = dict(cur.fetchall())
+        print(f"Reconciliation: {counts.get('new', 0)} new, "
+              f"{counts.get('changed', 0)} changed, {counts.get('removed', 0)} removed.")
+
+        if dry_run:
+            print("Dry run: rolling back, no changes applied.")
+            raw_conn.rollback()
+            return counts
+
+        col_list = ", ".join(quote_ident(c) for c in columns)
+        assignments = ", ".join(f"{quote_ident(c)} = s.{quote_ident(c)}" for c in non_key)
+
+        cur.execute(f"""
+            DELETE FROM {TABLE_NAME} t
+            USING masterlist_changes c
+            WHERE t.{key} = c.k AND c.change_type = 'removed'
+        """)
+        cur.execute(f"""
+            UPDATE {TABLE_NAME} t
+            SET {assignments}
+            FROM {staging_table} s
+            JOIN masterlist_changes c ON c.k = s.{key} AND c.change_type = 'changed'
+            WHERE t.{key} = s.{key}
+        """)
+        cur.execute(f"""
+            INSERT INTO {TABLE_NAME} ({col_list})
+            SELECT {', '.join(f's.{quote_ident(c)}' for c in columns)}
+            FROM {staging_table} s
+            JOIN masterlist_changes c ON c.k = s.{key} AND c.change_type = 'new'
+        """)
+
+        raw_conn.commit()
+        cur.close()
+        print(f"[SUCCESS] {TABLE_NAME} reconciled.")
+        return counts
+
+    except Exception as e:
+        raw_conn.rollback()
+        print(f"Error during masterlist ingest: {e}")
+        import traceback
+        traceback.print_exc()
+        return None
+    finally:
+        raw_conn.close()
+
+def main():
+    parser = argparse.ArgumentParser(description='Stream the masterlist workbook into masterlist_26_30')
+    parser.add_argument('xlsx_path', type=str, help='Path to the masterlist .xlsx file')
+    parser.add_argument('--cache-dir', type=str, default=DEFAULT_CACHE_DIR, help='Directory for the Parquet cache')
+    parser.add_argument('--batch-size', type=int, default=5000, help='Rows per streamed batch')
+    parser.add_argument('--force', action='store_true', help='Rebuild the Parquet cache even if the workbook is unchanged')
+    parser.add_argument('--dry-run', action='store_true', help='Report new/changed/removed rows without applying them')
+    args = parser.parse_args()
+
+    if not os.path.exists(args.xlsx_path):
+        print(f"Error: {args.xlsx_path} not found.")
+        sys.exit(1)
+
+    if reconcile(args.xlsx_path, args.cache_dir, args.batch_size, args.force, args.dry_run) is None:
+        sys.exit(1)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,337 @@
+
+import os
+from contextlib import contextmanager
+from urllib.parse import quote_plus
+import pandas as pd
+from sqlalchemy import create_engine, text
+
+# Shared database access for the Python pipeline and diagnostic scripts.
+#
+# Configuration (environment, or a .env file next to this module):
+#   INSIGHTED_DB_URL / DATABASE_URL   primary PostgreSQL (required)
+#   INSIGHTED_DB_REPLICA_URL          optional read-only replica for large reads
+#   INSIGHTED_MSSQL_ODBC              ODBC connection string for the Azure SQL copy
+#   DB_POOL_SIZE, DB_MAX_OVERFLOW, DB_POOL_RECYCLE_SECONDS
+#   DB_STATEMENT_TIMEOUT_MS, DB_CONNECT_TIMEOUT_SECONDS, DB_SSLMODE
+#
+# Engines are created once per process and reused, so a script pays the TLS
+# handshake to Azure once instead of once per query.
+
+try:
+    from dotenv import load_dotenv
+    load_dotenv(os.path.join(os.path.dirname(os.path.abspath(__file__)), '.env'))
+except ImportError:
+    pass
+
+POOL_SIZE = int(os.getenv('DB_POOL_SIZE', '5'))
+MAX_OVERFLOW = int(os.getenv('DB_MAX_OVERFLOW', '5'))
+POOL_RECYCLE_SECONDS = int(os.getenv('DB_POOL_RECYCLE_SECONDS', '1800'))
+STATEMENT_TIMEOUT_MS = int(os.getenv('DB_STATEMENT_TIMEOUT_MS', '600000'))
+CONNECT_TIMEOUT_SECONDS = int(os.getenv('DB_CONNECT_TIMEOUT_SECONDS', '15'))
+SSLMODE = os.getenv('DB_SSLMODE', 'require')
+STREAM_CHUNK_ROWS = 20000
+
+_engines = {}
+
+def normalize_url(url):
+    """Accepts the node-style postgres:// URLs from .env and returns a SQLAlchemy URL."""
+    if url.startswith('postgres://'):
+        url = 'postgresql://' + url[len('postgres://'):]
+    if url.startswith('postgresql://'):
+        url = 'postgresql+psycopg2://' + url[len('postgresql://'):]
+    return url
+
+def primary_url():
+    url = os.getenv('INSIGHTED_DB_URL') or os.getenv('DATABASE_URL')
+    if not url:
+        raise RuntimeError("No database configured. Set INSIGHTED_DB_URL (or DATABASE_URL) in the environment or .env.")
+    return normalize_url(url)
+
+def replica_url():
+    url = os.getenv('INSIGHTED_DB_REPLICA_URL')
+    return normalize_url(url) if url else None
+
+def make_engine(url, statement_timeout_ms=STATEMENT_TIMEOUT_MS, sslmode=SSLMODE, pool_size=POOL_SIZE, readonly=False):
+    """Pooled PostgreSQL engine with TCP keepalives and a per-statement timeout."""
+    options = f"-c statement_timeout={int(statement_timeout_ms)}"
+    if readonly:
+        options += " -c default_transaction_read_only=on"
+
+    connect_args = {
+        'connect_timeout': CONNECT_TIMEOUT_SECONDS,
+        'keepalives': 1,
+        'keepalives_idle': 30,
+        'keepalives_interval': 10,
+        'keepalives_count': 5,
+        'options': options,
+        'application_name': 'insighted-pipeline',
+    }
+    if sslmode and 'localhost' not in url and '127.0.0.1' not in url:
+        connect_args['sslmode'] = sslmode
+
+    return create_engine(
+        url,
+        pool_size=pool_size,
+        max_overflow=MAX_OVERFLOW,
+        pool_recycle=POOL_RECYCLE_SECONDS,
+        pool_pre_ping=True,
+        connect_args=connect_args,
+    )
+
+def get_engine(readonly=False):
+    """
+    Process-wide engine. readonly=True routes to the replica when one is
+    configured (and enforces read-only transactions); otherwise the primary.
+    """
+    key = 'replica' if readonly and replica_url() else 'primary'
+    if key not in _engines:
+        if key == 'replica':
+            _engines[key] = make_engine(replica_url(), readonly=True)
+        else:
+            _engines[key] = make_engine(primary_url())
+    return _engines[key]
+
+def get_mssql_engine():
+    """Engine for the Azure SQL Server copy (pyodbc)."""
+    if 'mssql' not in _engines:
+        odbc = os.getenv('INSIGHTED_MSSQL_ODBC')
+        if not odbc:
+            raise RuntimeError("INSIGHTED_MSSQL_ODBC is not set (ODBC connection string for the Azure SQL copy).")
+        _engines['mssql'] = create_engine(
+            f"mssql+pyodbc:///?odbc_connect={quote_plus(odbc)}",
+            pool_size=POOL_SIZE,
+            max_overflow=MAX_OVERFLOW,
+            pool_recycle=POOL_RECYCLE_SECONDS,
+            pool_pre_ping=True,
+        )
+    return _engines['mssql']
+
+def get_raw_connection(readonly=False):
+    """DB-API (psycopg2) connection from the pool, e.g. for COPY. Close it to return it."""
+    return get_engine(readonly).raw_connection()
+
+@contextmanager
+def statement_timeout(conn, timeout_ms):
+    """Overrides the statement timeout for the current transaction only."""
+    conn.execute(text(f"SET LOCAL statement_timeout = {int(timeout_ms)}"))
+    yield conn
+
+def read_sql(query, params=None, readonly=False, chunksize=None):
+    """
+    pd.read_sql through the shared pool. With chunksize, the rows are streamed
+    from a server-side cursor and the chunks are concatenated, so the driver
+    never buffers the whole result set in addition to the DataFrame.
+    """
+    if chunksize is None:
+        return pd.read_sql(query, get_engine(readonly), params=params)
+
+    frames = list(stream_sql(query, params, chunksize, readonly))
+    return pd.concat(frames, ignore_index=True) if frames else pd.DataFrame()
+
+def stream_sql(query, params=None, chunksize=STREAM_CHUNK_ROWS, readonly=True):
+    """Yields DataFrames of up to `chunksize` rows from a server-side cursor."""
+    with get_engine(readonly).connect() as conn:
+        conn = conn.execution_options(stream_results=True, max_row_buffer=chunksize)
+        for chunk in pd.read_sql(query, conn, params=params, chunksize=chunksize):
+            yield chunk
+
+# --- COPY READER ---
+# Bulk reads as COPY (SELECT ...) TO STDOUT in CSV, parsed by pyarrow's CSV
+# reader while the rows stream in (a writer thread feeds a pipe), instead of
+# one Python tuple per row through the driver. Column types come from the
+# query's own result description, so ids stay text and counts stay numeric.
+
+COPY_BLOCK_BYTES = 8 << 20
+COPY_NULL = r'\N'
+
+# PostgreSQL type OIDs read as typed Arrow columns; every other type is read as text
+PG_INT_TYPES = {20, 21, 23, 26}        # int8, int2, int4, oid
+PG_FLOAT_TYPES = {700, 701, 1700}      # float4, float8, numeric (as float64, not Decimal)
+PG_BOOL_TYPE = 16
+PG_TIMESTAMP_TYPES = {1114: False, 1184: True}  # timestamp, timestamptz (utc)
+PG_DATE_TYPE = 1082
+
+def bind_query(cur, query, params=None):
+    """The query with its parameters bound client-side (COPY takes no bind parameters)."""
+    sql = cur.mogrify(query, params) if params else query.encode('utf-8')
+    return sql.decode('utf-8').strip().rstrip(';')
+
+def describe_query(cur, sql):
+    """[(name, type oid)] of the query's result columns, without fetching rows."""
+    cur.execute(f"SELECT * FROM ({sql}) AS copy_source LIMIT 0")
+    return [(d.name, d.type_code) for d in cur.description]
+
+def arrow_column_types(columns):
+    import pyarrow as pa
+
+    types = {}
+    for name, oid in columns:
+        if oid in PG_INT_TYPES:
+            types[name] = pa.int64()
+        elif oid in PG_FLOAT_TYPES:
+            types[name] = pa.float64()
+        elif oid == PG_BOOL_TYPE:
+            types[name] = pa.bool_()
+        else:
+            types[name] = pa.string()
+    return types
+
+def arrow_to_frame(table, columns):
+    """DataFrame with the same dtypes pd.read_sql gives (timestamps and dates parsed)."""
+    df = table.to_pandas()
+    for name, oid in columns:
+        if oid in PG_TIMESTAMP_TYPES:
+            df[name] = pd.to_datetime(df[name], format='ISO8601', utc=PG_TIMESTAMP_TYPES[oid])
+        elif oid == PG_DATE_TYPE:
+            df[name] = pd.to_datetime(df[name], format='ISO8601').dt.date
+    return df
+
+def read_copy_csv(source, columns, chunksize=None):
+    """Yields DataFrames of up to `chunksize` rows (all rows if None) from COPY CSV output."""
+    import pyarrow as pa
+    import pyarrow.csv as pacsv
+
+    reader = pacsv.open_csv(
+        source,
+        read_options=pacsv.ReadOptions(block_size=COPY_BLOCK_BYTES),
+        parse_options=pacsv.ParseOptions(newlines_in_values=True),
+        convert_options=pacsv.ConvertOptions(
+            column_types=arrow_column_types(columns),
+            null_values=[COPY_NULL],
+            strings_can_be_null=True,
+            quoted_strings_can_be_null=False,
+            true_values=['t'],
+            false_values=['f'],
+        ),
+    )
+    limit = chunksize or float('inf')
+    pending, pending_rows, emitted = [], 0, False
+    for batch in reader:
+        pending.append(batch)
+        pending_rows += batch.num_rows
+        while pending_rows >= limit:
+            table = pa.Table.from_batches(pending, schema=reader.schema)
+            yield arrow_to_frame(table.slice(0, chunksize), columns)
+            emitted = True
+            rest = table.slice(chunksize)
+            pending, pending_rows = rest.to_batches(), rest.num_rows
+    if pending_rows or not emitted:
+        yield arrow_to_frame(pa.Table.from_batches(pending, schema=reader.schema), columns)
+
+def stream_copy(query, params=None, chunksize=STREAM_CHUNK_ROWS, readonly=True):
+    """
+    Yields DataFrames of up to `chunksize` rows (one frame if None) read with
+    COPY. Same query/params (pyformat) as stream_sql. Without pyarrow the rows
+    come through stream_sql instead.
+    """
+    import threading
+    try:
+        import pyarrow  # noqa: F401
+    except ImportError:
+        yield from stream_sql(query, params, chunksize or STREAM_CHUNK_ROWS, readonly)
+        return
+
+    conn = get_raw_connection(readonly)
+    read_fd, write_fd = os.pipe()
+    source = os.fdopen(read_fd, 'rb')
+    sink = os.fdopen(write_fd, 'wb')
+    errors = []
+    writer = None
+    try:
+        cur = conn.cursor()
+        sql = bind_query(cur, query, params)
+        columns = describe_query(cur, sql)
+
+        def write_copy():
+            try:
+                cur.copy_expert(f"COPY ({sql}) TO STDOUT WITH (FORMAT csv, HEADER true, NULL '{COPY_NULL}')", sink)
+            except Exception as e:
+                errors.append(e)
+            finally:
+                sink.close()
+
+        writer = threading.Thread(target=write_copy, name='copy-reader', daemon=True)
+        writer.start()
+        try:
+            yield from read_copy_csv(source, columns, chunksize)
+        except Exception:
+            # A failed COPY (e.g. statement timeout) surfaces here as truncated CSV
+            writer.join(timeout=5)
+            if errors:
+                raise errors[0]
+            raise
+        writer.join()
+        if errors:
+            raise errors[0]
+        conn.rollback()
+    finally:
+        if writer is not None and writer.is_alive():
+            # Consumer stopped early: cancel the COPY and let the writer unwind
+            conn.cancel()
+            source.close()
+            writer.join()
+            conn.invalidate()
+        elif writer is None:
+            sink.close()
+        source.close()
+        conn.close()
+
+def copy_sql(query, params=None, readonly=False, chunksize=None):
+    """
+    read_sql through COPY: the same result, without a Python tuple per row.
+    With chunksize the frames are streamed and concatenated (bounded driver memory).
+    """
+    frames = list(stream_copy(query, params, chunksize, readonly))
+    if not frames:
+        return pd.DataFrame()
+    return pd.concat(frames, ignore_index=True) if len(frames) > 1 else frames[0]
+
+def dispose_all():
+    for engine in _engines.values():
+        engine.dispose()
+    _engines.clear()
+
+@contextmanager
+def advisory_lock(key1, key2, shared=False, wait_seconds=600):
+    """
+    Session-level PostgreSQL advisory lock on (key1, key2), held on its own
+    pooled connection for the duration of the block. key2 may be a string; it
+    is mapped to an int4 with hashtext(). The request blocks in PostgreSQL's
+    lock queue (so an exclusive waiter is not overtaken by later shared ones),
+    bounded by lock_timeout (with statement_timeout raised to match); raises
+    TimeoutError if the lock is not granted within wait_seconds.
+    """
+    from sqlalchemy.exc import OperationalError
+
+    mode = "_shared" if shared else ""
+    key2_sql = "hashtext(:k2)" if isinstance(key2, str) else ":k2"
+    params = {'k1': int(key1), 'k2': key2}
+
+    conn = get_engine().connect()
+    acquired = False
+    try:
+        wait_ms = max(1, int(wait_seconds * 1000))
+        try:
+            # SET LOCAL ends with this transaction; the session lock outlives it.
+            # The pool's statement_timeout would otherwise cut the wait short.
+            with statement_timeout(conn, max(wait_ms + 1000, STATEMENT_TIMEOUT_MS)):
+                conn.execute(text(f"SET LOCAL lock_timeout = {wait_ms}"))
+                conn.execute(text(f"SELECT pg_advisory_lock{mode}(:k1, {key2_sql})"), params)
+            conn.commit()
+            acquired = True
+        except OperationalError as e:
+            conn.rollback()
+            # lock_not_available (lock_timeout) or query_canceled (statement_timeout)
+            if getattr(e.orig, 'pgcode', None) not in ('55P03', '57014'):
+                raise
+            raise TimeoutError(f"Could not acquire advisory lock ({key1}, {key2}) within {wait_seconds}s") from None
+        yield
+    finally:
+        if acquired:
+            try:
+                conn.execute(text(f"SELECT pg_advisory_unlock{mode}(:k1, {key2_sql})"), params)
+                conn.commit()
+            except Exception:
+                # Never hand a connection that may still hold the lock back to the pool
+                conn.invalidate()
+        conn.close()
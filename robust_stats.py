@@ -0,0 +1,75 @@
+
+import warnings
+import numpy as np
+
+# Robust column statistics for the ratio checks, all columns in one pass.
+# The columns are stacked into one (rows x columns) float matrix with NaN where
+# a value is not valid (e.g. a zero ratio), and every statistic is a single
+# NaN-aware NumPy reduction over axis 0:
+#   median, MAD, scale (1.4826 * MAD, the normal-consistent SD estimate),
+#   winsorized mean / SD (values clipped to the [w, 1 - w] quantiles).
+# Robust z = (x - median) / scale, so one extreme school cannot inflate the
+# spread that every other school is measured against.
+
+MAD_TO_SD = 1.4826
+WINSOR_LIMIT = 0.05
+
+def masked_matrix(df, cols, valid=None):
+    """(rows x len(cols)) float matrix of df[cols]; NaN where valid(values) is False or missing."""
+    values = df[cols].astype(float).to_numpy(dtype=np.float64, copy=True)
+    if valid is not None:
+        values[~valid(np.nan_to_num(values, nan=0.0)) | np.isnan(values)] = np.nan
+    return values
+
+class RobustStats:
+    """Per-column robust statistics of a masked matrix (see masked_matrix)."""
+    def __init__(self, columns, values, winsor=WINSOR_LIMIT):
+        self.columns = list(columns)
+        values = np.asarray(values, dtype=np.float64)
+        present = ~np.isnan(values)
+        self.n = present.sum(axis=0)
+        empty = self.n == 0
+
+        # Empty columns warn ("All-NaN slice"); they come out NaN, which is what we want
+        with warnings.catch_warnings():
+            warnings.simplefilter('ignore', RuntimeWarning)
+            self.median = np.nanmedian(values, axis=0)
+            self.mad = np.nanmedian(np.abs(values - self.median), axis=0)
+
+            low, high = np.nanquantile(values, [winsor, 1 - winsor], axis=0)
+            clipped = np.clip(values, low, high)
+            self.winsorized_mean = np.nanmean(clipped, axis=0)
+            self.winsorized_std = np.nanstd(clipped, axis=0)
+
+        # MAD is 0 when over half the values are identical: fall back to the winsorized SD
+        self.scale = np.where(self.mad > 0, MAD_TO_SD * self.mad, self.winsorized_std)
+        for name in ('median', 'mad', 'scale', 'winsorized_mean', 'winsorized_std'):
+            getattr(self, name)[empty] = np.nan
+
+    @classmethod
+    def fit(cls, df, cols, valid=None, winsor=WINSOR_LIMIT):
+        return cls(cols, masked_matrix(df, cols, valid), winsor)
+
+    def z(self, values, center=None, scale=None):
+        """Robust z of a matrix with the same columns (NaN where invalid or the scale is 0)."""
+        return robust_z(values, self.median if center is None else center, self.scale if scale is None else scale)
+
+    def entry(self, col):
+        i = self.columns.index(col)
+        return {
+            'n': int(self.n[i]),
+            'median': float(self.median[i]),
+            'mad': float(self.mad[i]),
+            'scale': float(self.scale[i]),
+            'winsorized_mean': float(self.winsorized_mean[i]),
+            'winsorized_std': float(self.winsorized_std[i]),
+        }
+
+def robust_z(values, center, scale):
+    """(x - center) / scale per column; NaN where x is NaN or the column's scale is missing or 0."""
+    center = np.asarray(center, dtype=np.float64)
+    scale = np.asarray(scale, dtype=np.float64)
+    usable = np.isfinite(scale) & (scale > 0)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        z = (np.asarray(values, dtype=np.float64) - center) / np.where(usable, scale, np.nan)
+    return z
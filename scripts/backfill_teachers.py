@@ -1,25 +1,28 @@
 import os
+import sys
 import psycopg2
 from dotenv import load_dotenv
 
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+from insighted_db import get_raw_connection
+
 def backfill_teachers():
     # Load environment variables
     load_dotenv()
     
-    # Get database URL from environment variables
-    db_url = os.getenv('DATABASE_URL') or os.getenv('NEW_DATABASE_URL')
-    
-    if not db_url:
-        print("❌ Error: DATABASE_URL or NEW_DATABASE_URL not found in .env file.")
-        return
+    # insighted_db reads INSIGHTED_DB_URL / DATABASE_URL; keep honouring NEW_DATABASE_URL
+    if not (os.getenv('INSIGHTED_DB_URL') or os.getenv('DATABASE_URL')):
+        if not os.getenv('NEW_DATABASE_URL'):
+            print("❌ Error: DATABASE_URL or NEW_DATABASE_URL not found in .env file.")
+            return
+        os.environ['INSIGHTED_DB_URL'] = os.getenv('NEW_DATABASE_URL')
 
     print("🚀 Connecting to database...")
     
     conn = None
     try:
-        # Connect to the database
-        # For Azure/Production Postgres, we usually need SSL
-        conn = psycopg2.connect(db_url, sslmode='require')
+        # Pooled connection (SSL, keepalives and statement timeout come from insighted_db)
+        conn = get_raw_connection()
         cur = conn.cursor()
         
         print("✅ Connected successfully.")
@@ -28,8 +31,18 @@ def backfill_teachers():
         # 1. Identify all registered schools from the users table (where role is 'School Head' and lastName is the school_id)
         # 2. Insert corresponding teachers from teachers_list into teacher_specialization_details
         # 3. Use ON CONFLICT (control_num) DO NOTHING to prevent duplicates
+        # 4. Skip records teacher_dedupe.py confirmed as duplicates under another control_num
         
-        backfill_query = """
+        cur.execute("SELECT to_regclass('public.teacher_duplicate_records')")
+        has_dedupe = cur.fetchone()[0] is not None
+        dedupe_filter = """
+        WHERE NOT EXISTS (
+            SELECT 1 FROM teacher_duplicate_records d WHERE d.control_num = tl."control_num"
+        )""" if has_dedupe else ""
+        if not has_dedupe:
+            print("⚠️ teacher_duplicate_records not found (run teacher_dedupe.py); duplicates are not filtered.")
+
+        backfill_query = f"""
         INSERT INTO teacher_specialization_details (
             iern, control_num, school_id, full_name, position, position_group, 
             specialization, teaching_load, created_at, updated_at
@@ -51,7 +64,7 @@ def backfill_teachers():
             -- Per api/index.js, School Heads have their school_id stored in first_name or last_name depending on registration logic
             -- But we can also get them from school_profiles if they were successfully registered
             SELECT school_id FROM school_profiles
-        ) sp ON tl."school.id" = sp.school_id
+        ) sp ON tl."school.id" = sp.school_id{dedupe_filter}
         ON CONFLICT (control_num) DO NOTHING;
         """
         
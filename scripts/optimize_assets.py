@@ -0,0 +1,266 @@
+import os
+import sys
+import json
+import hashlib
+import argparse
+from PIL import Image, ImageChops
+
+# Static asset optimizer for public/.
+# - Recompresses PNGs losslessly (pixel-identical, replaced only if smaller)
+# - Optionally re-saves JPEGs near-losslessly (--near-lossless)
+# - Generates responsive WebP variants + a manifest mapping originals to them
+# - Reports assets over the per-file / total precache byte budget
+# Unchanged files are skipped using content hashes, so CI runs stay fast.
+
+BASE_DIR = os.path.abspath(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'public'))
+OUTPUT_DIRNAME = "optimized"
+CACHE_FILE = ".asset-cache.json"
+MANIFEST_FILE = "asset-manifest.json"
+
+# Bump when optimization logic changes so every file is reprocessed
+PIPELINE_VERSION = 1
+
+# Generated elsewhere (scripts/resize_icons.py) or by this script
+SKIP_DIRS = {'icons', OUTPUT_DIRNAME}
+
+IMAGE_EXTENSIONS = {'.png', '.jpg', '.jpeg'}
+RESPONSIVE_WIDTHS = [320, 640, 1024, 1600]
+MIN_VARIANT_SOURCE_WIDTH = 64
+WEBP_OPTIONS = {'quality': 85, 'method': 6}
+
+# Mirrors injectManifest.globPatterns in vite.config.js
+PRECACHE_EXTENSIONS = {'.js', '.css', '.html', '.ico', '.png', '.svg'}
+
+DEFAULT_FILE_BUDGET = 300 * 1024
+DEFAULT_TOTAL_BUDGET = 2 * 1024 * 1024
+
+def file_sha256(path):
+    h = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(1024 * 1024), b''):
+            h.update(chunk)
+    return h.hexdigest()
+
+def config_sha256(near_lossless):
+    payload = json.dumps({
+        'version': PIPELINE_VERSION,
+        'widths': RESPONSIVE_WIDTHS,
+        'webp': WEBP_OPTIONS,
+        'near_lossless': near_lossless,
+    }, sort_keys=True)
+    return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+def walk_public(base_dir, include_generated=False):
+    for root, dirs, files in os.walk(base_dir):
+        rel_root = os.path.relpath(root, base_dir)
+        if rel_root == '.' and not include_generated:
+            dirs[:] = [d for d in dirs if d not in SKIP_DIRS]
+        for name in files:
+            if name.startswith('.'):
+                continue
+            yield os.path.join(root, name)
+
+def variant_name(rel_path, width):
+    stem = os.path.splitext(rel_path)[0].replace(os.sep, '/')
+    suffix = f"-{width}w" if width else ""
+    return f"{stem}{suffix}.webp"
+
+# --- RECOMPRESSION ---
+
+def same_pixels(a, b):
+    if a.size != b.size:
+        return False
+    return ImageChops.difference(a.convert('RGBA'), b.convert('RGBA')).getbbox() is None
+
+def recompress_png(path):
+    """Lossless: candidate must decode to identical pixels and be smaller."""
+    original_size = os.path.getsize(path)
+    with Image.open(path) as img:
+        img.load()
+        candidate = img
+        # Fully opaque RGBA can drop its alpha channel without changing pixels
+        if img.mode == 'RGBA' and img.getchannel('A').getextrema() == (255, 255):
+            candidate = img.convert('RGB')
+
+        tmp_path = path + ".tmp"
+        candidate.save(tmp_path, format='PNG', optimize=True)
+
+        with Image.open(tmp_path) as check:
+            check.load()
+            identical = same_pixels(img, check)
+
+    new_size = os.path.getsize(tmp_path)
+    if identical and new_size < original_size:
+        os.replace(tmp_path, path)
+        return original_size - new_size
+    os.remove(tmp_path)
+    return 0
+
+def recompress_jpeg(path):
+    """Near-lossless: keeps the source quantization tables."""
+    original_size = os.path.getsize(path)
+    tmp_path = path + ".tmp"
+    with Image.open(path) as img:
+        img.save(tmp_path, format='JPEG', quality='keep', optimize=True, progressive=True)
+    new_size = os.path.getsize(tmp_path)
+    if new_size < original_size:
+        os.replace(tmp_path, path)
+        return original_size - new_size
+    os.remove(tmp_path)
+    return 0
+
+# --- RESPONSIVE VARIANTS ---
+
+def build_variants(path, rel_path, output_dir):
+    variants = []
+    with Image.open(path) as img:
+        img.load()
+        width, height = img.size
+        if width < MIN_VARIANT_SOURCE_WIDTH:
+            return variants
+
+        mode = 'RGBA' if 'A' in img.getbands() or img.mode == 'P' else 'RGB'
+        source = img.convert(mode)
+
+        # Smaller breakpoints plus one full-width WebP
+        targets = [w for w in RESPONSIVE_WIDTHS if w < width] + [None]
+        for target in targets:
+            out_rel = variant_name(rel_path, target)
+            out_path = os.path.join(output_dir, out_rel)
+            os.makedirs(os.path.dirname(out_path), exist_ok=True)
+
+            if target:
+                resized = source.resize((target, max(1, round(height * target / width))), Image.Resampling.LANCZOS)
+            else:
+                resized = source
+            resized.save(out_path, format='WEBP', **WEBP_OPTIONS)
+
+            variants.append({
+                'src': f"{OUTPUT_DIRNAME}/{out_rel}",
+                'width': resized.size[0],
+                'height': resized.size[1],
+                'bytes': os.path.getsize(out_path)
+            })
+    return variants
+
+# --- BUDGET REPORT ---
+
+def budget_report(base_dir, file_budget, total_budget):
+    over_file = []
+    precache_total = 0
+
+    # Generated folders are served too, so they count against the budget
+    for path in walk_public(base_dir, include_generated=True):
+        rel = os.path.relpath(path, base_dir)
+        size = os.path.getsize(path)
+        if os.path.splitext(path)[1].lower() in PRECACHE_EXTENSIONS:
+            precache_total += size
+        if size > file_budget:
+            over_file.append((rel, size))
+
+    print("\n=== Asset Budget Report ===")
+    print(f"Per-file budget: {file_budget:,} bytes | Precache total budget: {total_budget:,} bytes")
+
+    if over_file:
+        print(f"\n{len(over_file)} asset(s) over the per-file budget:")
+        for rel, size in sorted(over_file, key=lambda x: x[1], reverse=True):
+            print(f"  {size:>12,}  {rel}  (+{size - file_budget:,})")
+    else:
+        print("\nNo asset exceeds the per-file budget.")
+
+    status = "OVER" if precache_total > total_budget else "OK"
+    print(f"\nPrecache payload: {precache_total:,} bytes [{status}]")
+
+    return not over_file and precache_total <= total_budget
+
+# --- DRIVER ---
+
+def optimize_assets(base_dir, near_lossless=False, force=False):
+    output_dir = os.path.join(base_dir, OUTPUT_DIRNAME)
+    os.makedirs(output_dir, exist_ok=True)
+    cache_path = os.path.join(output_dir, CACHE_FILE)
+    manifest_path = os.path.join(output_dir, MANIFEST_FILE)
+
+    cache = {}
+    if os.path.exists(cache_path) and not force:
+        with open(cache_path, 'r', encoding='utf-8') as f:
+            cache = json.load(f)
+
+    cfg_hash = config_sha256(near_lossless)
+    manifest = {}
+    saved_bytes = 0
+    processed = 0
+    skipped = 0
+
+    for path in walk_public(base_dir):
+        ext = os.path.splitext(path)[1].lower()
+        if ext not in IMAGE_EXTENSIONS:
+            continue
+
+        rel = os.path.relpath(path, base_dir).replace(os.sep, '/')
+        current_hash = file_sha256(path)
+        entry = cache.get(rel)
+
+        if (entry and entry.get('sha256') == current_hash and entry.get('config') == cfg_hash
+                and all(os.path.exists(os.path.join(base_dir, v['src'])) for v in entry.get('variants', []))):
+            manifest[rel] = entry['manifest']
+            skipped += 1
+            continue
+
+        print(f"Optimizing {rel}...")
+        try:
+            if ext == '.png':
+                saved = recompress_png(path)
+            elif near_lossless:
+                saved = recompress_jpeg(path)
+            else:
+                saved = 0
+            saved_bytes += saved
+            if saved:
+                print(f"  recompressed, saved {saved:,} bytes")
+
+            variants = build_variants(path, rel, output_dir)
+            manifest[rel] = {
+                'original': rel,
+                'bytes': os.path.getsize(path),
+                'variants': variants
+            }
+            # Hash after recompression so the next run sees it as unchanged
+            cache[rel] = {
+                'sha256': file_sha256(path),
+                'config': cfg_hash,
+                'variants': variants,
+                'manifest': manifest[rel]
+            }
+            processed += 1
+        except Exception as e:
+            print(f"  Failed to optimize {rel}: {e}")
+
+    # Forget files that were deleted from public/
+    cache = {k: v for k, v in cache.items() if k in manifest}
+
+    with open(manifest_path, 'w', encoding='utf-8') as f:
+        json.dump(manifest, f, indent=2, sort_keys=True)
+    with open(cache_path, 'w', encoding='utf-8') as f:
+        json.dump(cache, f, indent=2, sort_keys=True)
+
+    print(f"\nOptimized {processed} image(s), {skipped} unchanged. Saved {saved_bytes:,} bytes.")
+    print(f"Manifest written to {os.path.relpath(manifest_path, base_dir)}")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='Optimize static assets in public/ and check size budgets')
+    parser.add_argument('--public-dir', type=str, default=BASE_DIR, help='Static asset directory')
+    parser.add_argument('--near-lossless', action='store_true', help='Also re-save JPEGs (keeps quantization tables)')
+    parser.add_argument('--file-budget', type=int, default=DEFAULT_FILE_BUDGET, help='Per-file byte budget')
+    parser.add_argument('--total-budget', type=int, default=DEFAULT_TOTAL_BUDGET, help='Total precache byte budget')
+    parser.add_argument('--report-only', action='store_true', help='Skip optimization, only print the budget report')
+    parser.add_argument('--strict', action='store_true', help='Exit non-zero when a budget is exceeded (for CI)')
+    parser.add_argument('--force', action='store_true', help='Ignore the content-hash cache')
+    args = parser.parse_args()
+
+    if not args.report_only:
+        optimize_assets(args.public_dir, args.near_lossless, args.force)
+
+    within_budget = budget_report(args.public_dir, args.file_budget, args.total_budget)
+    if args.strict and not within_budget:
+        sys.exit(1)
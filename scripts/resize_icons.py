@@ -1,27 +1,189 @@
 import os
-from PIL import Image
+import sys
+import json
+import hashlib
+import argparse
+from concurrent.futures import ProcessPoolExecutor
+from PIL import Image, features
 
-def resize_image(input_path, output_path, size):
-    try:
-        if not os.path.exists(input_path):
-            print(f"Error: {input_path} not found.")
-            return
+# Icon build step for the PWA.
+# The master image is decoded once, then every size the manifest and index.html
+# need is rendered and encoded on a process pool. Outputs go to public/icons/,
+# so the master is never overwritten and repeated runs don't degrade it.
 
-        with Image.open(input_path) as img:
-            img = img.resize(size, Image.Resampling.LANCZOS)
-            img.save(output_path, optimize=True)
-            print(f"Resized {input_path} to {size} and saved to {output_path}")
-    except Exception as e:
-        print(f"Failed to resize {input_path}: {e}")
+BASE_DIR = os.path.abspath(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'public'))
+DEFAULT_SOURCE = os.path.join(BASE_DIR, "InsightED app.png")
+DEFAULT_OUTPUT_DIR = os.path.join(BASE_DIR, "icons")
+CACHE_FILE = ".icon-cache.json"
 
-if __name__ == "__main__":
-    # Define paths
-    base_dir = r"e:\InsightEd-Mobile-PWA\public"
-    app_icon = os.path.join(base_dir, "InsightED app.png")
-    apple_icon = os.path.join(base_dir, "apple-touch-icon.png")
+# Bump when rendering/encoding logic changes so cached outputs are rebuilt
+PIPELINE_VERSION = 1
+
+# (file name, pixel size, variant, formats)
+# - any:      plain resize, transparency kept
+# - maskable: artwork scaled into the 80% safe zone on a solid background
+# - apple:    opaque (iOS renders transparency as black)
+ICON_SPECS = [
+    ('favicon-16x16', 16, 'any', ['png']),
+    ('favicon-32x32', 32, 'any', ['png']),
+    ('pwa-192x192', 192, 'any', ['png', 'webp', 'avif']),
+    ('pwa-512x512', 512, 'any', ['png', 'webp', 'avif']),
+    ('maskable-192x192', 192, 'maskable', ['png', 'webp', 'avif']),
+    ('maskable-512x512', 512, 'maskable', ['png', 'webp', 'avif']),
+    ('apple-touch-icon-152x152', 152, 'apple', ['png']),
+    ('apple-touch-icon-167x167', 167, 'apple', ['png']),
+    ('apple-touch-icon', 180, 'apple', ['png']),
+]
+
+MASKABLE_SAFE_ZONE = 0.8
+
+SAVE_OPTIONS = {
+    'png': {'optimize': True},
+    'webp': {'quality': 90, 'method': 6},
+    'avif': {'quality': 70, 'speed': 4},
+}
+
+def file_sha256(path):
+    h = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(1024 * 1024), b''):
+            h.update(chunk)
+    return h.hexdigest()
+
+def config_sha256():
+    payload = json.dumps({
+        'version': PIPELINE_VERSION,
+        'specs': ICON_SPECS,
+        'safe_zone': MASKABLE_SAFE_ZONE,
+        'save_options': SAVE_OPTIONS,
+    }, sort_keys=True)
+    return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+def expected_outputs(output_dir):
+    return [os.path.join(output_dir, f"{name}.{fmt}") for name, _, _, formats in ICON_SPECS for fmt in formats]
+
+# --- WORKER SIDE ---
+# Each worker rebuilds the master from raw pixels once (initializer), not per job.
+_MASTER = None
+_BACKGROUND = None
+
+def _init_worker(mode, size, raw, background):
+    global _MASTER, _BACKGROUND
+    _MASTER = Image.frombytes(mode, size, raw)
+    _BACKGROUND = background
+
+def render_variant(master, size, variant, background):
+    if variant == 'maskable':
+        inner = max(1, round(size * MASKABLE_SAFE_ZONE))
+        artwork = master.resize((inner, inner), Image.Resampling.LANCZOS)
+        canvas = Image.new('RGBA', (size, size), background + (255,))
+        offset = (size - inner) // 2
+        canvas.alpha_composite(artwork, (offset, offset))
+        return canvas
+
+    icon = master.resize((size, size), Image.Resampling.LANCZOS)
+    if variant == 'apple':
+        canvas = Image.new('RGBA', (size, size), background + (255,))
+        canvas.alpha_composite(icon)
+        return canvas.convert('RGB')
+    return icon
+
+def _build_icon(job):
+    name, size, variant, formats, output_dir = job
+    img = render_variant(_MASTER, size, variant, _BACKGROUND)
+
+    written = []
+    for fmt in formats:
+        out_path = os.path.join(output_dir, f"{name}.{fmt}")
+        tmp_path = out_path + ".tmp"
+        img.save(tmp_path, format=fmt.upper(), **SAVE_OPTIONS[fmt])
+        os.replace(tmp_path, out_path)
+        written.append((out_path, os.path.getsize(out_path)))
+    return written
+
+# --- DRIVER ---
+
+def corner_background(img):
+    """Uses the master's top-left pixel as padding/flatten colour."""
+    r, g, b, _ = img.getpixel((0, 0))
+    return (r, g, b)
 
-    # Resize InsightED app.png to 512x512
-    resize_image(app_icon, app_icon, (512, 512))
+def write_manifest_fragment(output_dir):
+    """icons.json: the web manifest `icons` entries for the generated files."""
+    icons = []
+    for name, size, variant, formats in ICON_SPECS:
+        if variant == 'apple' or name.startswith('favicon'):
+            continue
+        for fmt in formats:
+            icons.append({
+                'src': f"icons/{name}.{fmt}",
+                'sizes': f"{size}x{size}",
+                'type': f"image/{fmt}",
+                'purpose': variant
+            })
+    with open(os.path.join(output_dir, 'icons.json'), 'w', encoding='utf-8') as f:
+        json.dump(icons, f, indent=2)
+
+def build_icons(source, output_dir, workers=None, force=False):
+    if not os.path.exists(source):
+        print(f"Error: {source} not found.")
+        return False
+
+    os.makedirs(output_dir, exist_ok=True)
+    cache_path = os.path.join(output_dir, CACHE_FILE)
+
+    source_hash = file_sha256(source)
+    config_hash = config_sha256()
+    outputs = expected_outputs(output_dir)
+
+    if not force and os.path.exists(cache_path):
+        with open(cache_path, 'r', encoding='utf-8') as f:
+            cache = json.load(f)
+        if (cache.get('source_sha256') == source_hash
+                and cache.get('config_sha256') == config_hash
+                and all(os.path.exists(p) for p in outputs)):
+            print(f"Icons up to date (source {source_hash[:12]}). Nothing to do.")
+            return True
+
+    if not features.check('avif'):
+        print("Error: this Pillow build has no AVIF support (Pillow >= 11.3 ships it).")
+        return False
+
+    # Decode once
+    with Image.open(source) as img:
+        master = img.convert('RGBA')
+    print(f"Decoded {os.path.basename(source)} ({master.size[0]}x{master.size[1]})")
+
+    largest = max(size for _, size, _, _ in ICON_SPECS)
+    if master.size[0] < largest or master.size[1] < largest:
+        print(f"Warning: master is smaller than the largest icon ({largest}px); icons will be upscaled.")
+
+    background = corner_background(master)
+    jobs = [(name, size, variant, formats, output_dir) for name, size, variant, formats in ICON_SPECS]
+
+    total_bytes = 0
+    with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker,
+                             initargs=(master.mode, master.size, master.tobytes(), background)) as pool:
+        for written in pool.map(_build_icon, jobs):
+            for path, nbytes in written:
+                total_bytes += nbytes
+                print(f"  {os.path.relpath(path, BASE_DIR)} ({nbytes:,} bytes)")
+
+    write_manifest_fragment(output_dir)
+
+    with open(cache_path, 'w', encoding='utf-8') as f:
+        json.dump({'source_sha256': source_hash, 'config_sha256': config_hash}, f, indent=2)
+
+    print(f"Generated {len(outputs)} icons ({total_bytes:,} bytes) in {output_dir}")
+    return True
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='Build PWA icons from the master image')
+    parser.add_argument('--source', type=str, default=DEFAULT_SOURCE, help='Master icon image')
+    parser.add_argument('--output-dir', type=str, default=DEFAULT_OUTPUT_DIR, help='Where generated icons are written')
+    parser.add_argument('--workers', type=int, default=None, help='Process pool size (default: CPU count)')
+    parser.add_argument('--force', action='store_true', help='Regenerate even if the source is unchanged')
+    args = parser.parse_args()
 
-    # Resize apple-touch-icon.png to 180x180
-    resize_image(apple_icon, apple_icon, (180, 180))
+    ok = build_icons(args.source, args.output_dir, args.workers, args.force)
+    sys.exit(0 if ok else 1)
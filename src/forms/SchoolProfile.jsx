@@ -12,6 +12,7 @@ import LocationPickerMap from '../components/LocationPickerMap';
 import OfflineSuccessModal from '../components/OfflineSuccessModal';
 import SuccessModal from '../components/SuccessModal'; // NEW // NEW
 import { normalizeOffering } from '../utils/dataNormalization';
+import { loadScoringBaseline, evaluateScoringBaseline, profileTotals } from '../utils/scoringBaseline';
 
 const SchoolProfile = ({ embedded }) => {
     const navigate = useNavigate();
@@ -51,6 +52,7 @@ const SchoolProfile = ({ embedded }) => {
     const [isOffline, setIsOffline] = useState(!navigator.onLine);
     const [isLocked, setIsLocked] = useState(false); // New State
     const [schoolNameWarning, setSchoolNameWarning] = useState(""); // Validation Warning
+    const [dataCheckMessages, setDataCheckMessages] = useState([]); // Offline data health checks
     const [currentUserLocation, setCurrentUserLocation] = useState(null); // NEW: User's real-time location
 
     // Dropdowns
@@ -331,6 +333,12 @@ const SchoolProfile = ({ embedded }) => {
                             setOriginalData(loadedData);
                         }
 
+                        // Data health preview on the submitted figures (offline baseline bundle)
+                        loadScoringBaseline().then((baseline) => {
+                            if (!isMounted || !baseline?.totals) return;
+                            setDataCheckMessages(evaluateScoringBaseline(baseline, profileTotals(baseline, dbData)).messages);
+                        });
+
                         // Re-apply options if we have maps now? 
                         // Note: We don't have access to the *result* of loadDirectory here easily due to closure.
                         // But we can let the separate Effect handle options update.
@@ -675,6 +683,14 @@ const SchoolProfile = ({ embedded }) => {
                                 </div>
                             </div>
                         )}
+                        {dataCheckMessages.length > 0 && (
+                            <div className="bg-amber-50 dark:bg-amber-900/20 border-l-4 border-amber-500 text-amber-800 dark:text-amber-300 p-4 mb-6 rounded-xl shadow-sm" role="alert">
+                                <p className="font-bold text-sm">⚠️ Data checks on your submitted figures</p>
+                                <ul className="text-xs mt-2 space-y-1 list-disc list-inside">
+                                    {dataCheckMessages.map((message) => <li key={message}>{message}</li>)}
+                                </ul>
+                            </div>
+                        )}
                         <form onSubmit={(e) => { e.preventDefault(); setAck1(false); setAck2(false); setShowSaveModal(true); }}>
                             <fieldset disabled={isAuditMode || isOffline || viewOnly || isLocked || isDummy || isReadOnly} className="disabled:opacity-95">
 
@@ -0,0 +1,96 @@
+// Offline version of the per-school data health checks.
+// The bundle is published by advanced_fraud_detection.py after each full batch
+// (public/validation/scoring-baseline.json); evaluateScoringBaseline mirrors the
+// pipeline's outlier, anomaly, zero-value and experience-mismatch rules, and
+// verify_scoring_baseline.py checks both against the pipeline's own flags.
+// profileTotals rebuilds the summary totals from a school_profiles row (before
+// the server's imputation), so forms can preview the checks on what they hold.
+// Peer, change-over-time, clone, roster and per-grade checks still need the server.
+
+const CACHE_KEY = 'CACHE_SCORING_BASELINE';
+
+export const loadScoringBaseline = async () => {
+    try {
+        const res = await fetch(`${import.meta.env.BASE_URL}validation/scoring-baseline.json`, { cache: 'no-cache' });
+        if (res.ok) {
+            const baseline = await res.json();
+            localStorage.setItem(CACHE_KEY, JSON.stringify(baseline));
+            return baseline;
+        }
+    } catch (err) {
+        console.warn('Scoring baseline unavailable, using cached copy:', err.message);
+    }
+    const cached = localStorage.getItem(CACHE_KEY);
+    return cached ? JSON.parse(cached) : null;
+};
+
+const num = (value) => {
+    const n = Number(value);
+    return Number.isFinite(n) ? n : 0;
+};
+
+// profile: a school_profiles row (as /api/school-by-user returns it)
+export const profileTotals = (baseline, profile) => {
+    const sum = (cols) => cols.reduce((acc, col) => acc + num(profile[col]), 0);
+    return Object.fromEntries(Object.entries(baseline.totals || {}).map(([total, recipe]) => (
+        [total, Math.max(...recipe.max_of.map(sum)) + sum(recipe.plus)]
+    )));
+};
+
+// totals: { total_learners, total_teachers, total_classrooms, ... } as in school_summary
+export const evaluateScoringBaseline = (baseline, totals) => {
+    const flags = {};
+    const details = {};
+    const learners = num(totals.total_learners);
+    const { thresholds } = baseline;
+
+    Object.entries(baseline.ratios).forEach(([ratio, r]) => {
+        const denominator = num(totals[r.denominator]);
+        const value = denominator > 0 ? learners / denominator : 0;
+        // Ratios are checked on the log scale: robust z of log(value) (bundle format 2)
+        let z = null;
+        if (value > 0 && r.scale > 0) z = (Math.log(value) - r.center) / r.scale;
+        details[ratio] = { value, z };
+        flags[`flag_outlier_${ratio}`] = z !== null && Math.abs(z) > thresholds.outlier_z;
+    });
+
+    Object.entries(baseline.anomalies).forEach(([name, a]) => {
+        const actual = num(totals[a.metric]);
+        const valid = learners > 0 && actual > 0;
+        let z = null;
+        let expected = null;
+        if (a.slope !== null) {
+            expected = learners * a.slope;
+            if (valid && a.residual_std > 0) z = (actual - expected - a.residual_mean) / a.residual_std;
+        }
+        details[name] = { actual, expected, z };
+        flags[`flag_anomaly_${name}`] = valid && z !== null && Math.abs(z) > thresholds.anomaly_z;
+    });
+
+    Object.entries(baseline.zero_flags).forEach(([flag, metric]) => {
+        flags[flag] = num(totals[metric]) === 0 && learners > 0;
+    });
+
+    const teachers = num(totals.total_teachers);
+    flags.flag_exp_mismatch = teachers > 0 && num(totals.total_teaching_experience) !== teachers;
+
+    const raised = Object.keys(flags).filter((flag) => flags[flag]);
+    const zeroCount = raised.filter((flag) => flag.startsWith('flag_zero_')).length;
+    const otherCount = raised.length - zeroCount;
+
+    // Score preview from the local checks only (the server adds the rest)
+    let score = Math.max(100 - zeroCount * thresholds.zero_flag_penalty - otherCount * thresholds.other_flag_penalty, 0);
+    if ((flags.flag_zero_teachers || flags.flag_zero_classrooms) && score > thresholds.missing_key_resource_cap) {
+        score = thresholds.missing_key_resource_cap;
+    }
+    if (learners === 0) score = 0;
+
+    return {
+        version: baseline.version,
+        flags,
+        details,
+        raised,
+        messages: raised.map((flag) => baseline.messages[flag]).filter(Boolean),
+        scorePreview: score,
+    };
+};
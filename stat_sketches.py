@@ -0,0 +1,313 @@
+
+import json
+import numpy as np
+
+# Mergeable statistics for the metrics the pipeline standardizes on.
+# Every accumulator can be built from any slice of the rows (a chunk, a worker,
+# a region) and merged with the others; the merged result is the same as one
+# pass over all rows (exactly for the moments, within the KLL rank error for
+# quantiles). All of them round-trip through to_dict / from_dict (JSON) so they
+# can be persisted and picked up by the next run.
+#
+#   KLLSketch      quantiles, median and MAD (Karnin-Lang-Liberty)
+#   Moments        count, mean, variance, min, max (Chan et al. parallel update)
+#   CoMoments      the same for (x, y) pairs plus the co-moment, enough for a
+#                  regression slope and the residual mean / variance
+#   MetricSketch   KLLSketch + Moments for one metric
+
+KLL_K = 256                 # rank error under ~0.5% of n with high probability
+KLL_DECAY = 2.0 / 3.0
+
+class KLLSketch:
+    """
+    Quantile sketch. Level h holds items of weight 2**h; a level over capacity is
+    sorted and every other item (random offset) is promoted to the next level.
+    Exact (plain quantiles of every value) until the first compaction.
+    """
+    def __init__(self, k=KLL_K, seed=0):
+        self.k = k
+        self.seed = seed
+        self.n = 0
+        self.compactions = 0
+        self.levels = [np.empty(0, dtype=np.float64)]
+
+    def capacity(self, level):
+        depth = len(self.levels) - 1 - level
+        return max(2, int(np.ceil(self.k * KLL_DECAY ** depth)))
+
+    def update(self, values):
+        values = np.asarray(values, dtype=np.float64).ravel()
+        values = values[np.isfinite(values)]
+        if len(values) == 0:
+            return self
+        self.levels[0] = np.concatenate([self.levels[0], values])
+        self.n += len(values)
+        self.compress()
+        return self
+
+    def merge(self, other):
+        while len(self.levels) < len(other.levels):
+            self.levels.append(np.empty(0, dtype=np.float64))
+        for h, items in enumerate(other.levels):
+            self.levels[h] = np.concatenate([self.levels[h], items])
+        self.n += other.n
+        self.compactions += other.compactions
+        self.compress()
+        return self
+
+    def compress(self):
+        h = 0
+        while h < len(self.levels):
+            items = self.levels[h]
+            if len(items) <= self.capacity(h):
+                h += 1
+                continue
+            if h + 1 == len(self.levels):
+                self.levels.append(np.empty(0, dtype=np.float64))
+            items = np.sort(items)
+            # An odd item out stays behind so the promoted weight is exact
+            kept = items[:1] if len(items) % 2 else items[:0]
+            paired = items[len(kept):]
+            offset = int(np.random.default_rng([self.seed, self.compactions]).integers(2))
+            self.compactions += 1
+            self.levels[h + 1] = np.concatenate([self.levels[h + 1], paired[offset::2]])
+            self.levels[h] = kept
+            # Capacities depend on the number of levels: start over from the bottom
+            h = 0
+
+    def is_exact(self):
+        return len(self.levels) == 1
+
+    def weighted_items(self):
+        items = np.concatenate(self.levels)
+        weights = np.concatenate([np.full(len(level), 2.0 ** h) for h, level in enumerate(self.levels)])
+        order = np.argsort(items, kind='stable')
+        return items[order], weights[order]
+
+    def quantiles(self, qs):
+        qs = np.atleast_1d(np.asarray(qs, dtype=np.float64))
+        if self.n == 0:
+            return np.full(len(qs), np.nan)
+        if self.is_exact():
+            return np.quantile(self.levels[0], qs)
+        items, weights = self.weighted_items()
+        return weighted_quantiles(items, weights, qs)
+
+    def quantile(self, q):
+        return float(self.quantiles([q])[0])
+
+    def median(self):
+        return self.quantile(0.5)
+
+    def mad(self, center=None):
+        """Median absolute deviation from `center` (default: the median)."""
+        if self.n == 0:
+            return np.nan
+        center = self.median() if center is None else center
+        if self.is_exact():
+            return float(np.median(np.abs(self.levels[0] - center)))
+        items, weights = self.weighted_items()
+        deviations = np.abs(items - center)
+        order = np.argsort(deviations, kind='stable')
+        return float(weighted_quantiles(deviations[order], weights[order], [0.5])[0])
+
+    def rank(self, value):
+        """Approximate fraction of values <= value."""
+        if self.n == 0:
+            return np.nan
+        items, weights = self.weighted_items()
+        return float(weights[items <= value].sum() / weights.sum())
+
+    def to_dict(self):
+        return {'type': 'kll', 'k': self.k, 'seed': self.seed, 'n': self.n,
+                'compactions': self.compactions, 'levels': [level.tolist() for level in self.levels]}
+
+    @classmethod
+    def from_dict(cls, data):
+        sketch = cls(k=data['k'], seed=data['seed'])
+        sketch.n = data['n']
+        sketch.compactions = data['compactions']
+        sketch.levels = [np.asarray(level, dtype=np.float64) for level in data['levels']] or [np.empty(0)]
+        return sketch
+
+def weighted_quantiles(items, weights, qs):
+    """Quantiles of sorted weighted items: the first item whose cumulative weight reaches q."""
+    cumulative = np.cumsum(weights)
+    targets = np.asarray(qs, dtype=np.float64) * cumulative[-1]
+    idx = np.minimum(np.searchsorted(cumulative, targets, side='left'), len(items) - 1)
+    return items[idx]
+
+class Moments:
+    """Count, mean, M2 (sum of squared deviations), min and max of a stream."""
+    def __init__(self):
+        self.n = 0
+        self.mean = 0.0
+        self.m2 = 0.0
+        self.min = np.inf
+        self.max = -np.inf
+
+    def update(self, values):
+        values = np.asarray(values, dtype=np.float64).ravel()
+        values = values[np.isfinite(values)]
+        if len(values) == 0:
+            return self
+        batch = Moments()
+        batch.n = len(values)
+        batch.mean = float(values.mean())
+        batch.m2 = float(((values - batch.mean) ** 2).sum())
+        batch.min = float(values.min())
+        batch.max = float(values.max())
+        return self.merge(batch)
+
+    def merge(self, other):
+        if other.n == 0:
+            return self
+        n = self.n + other.n
+        delta = other.mean - self.mean
+        self.mean += delta * other.n / n
+        self.m2 += other.m2 + delta * delta * self.n * other.n / n
+        self.n = n
+        self.min = min(self.min, other.min)
+        self.max = max(self.max, other.max)
+        return self
+
+    def variance(self, ddof=0):
+        return self.m2 / (self.n - ddof) if self.n > ddof else np.nan
+
+    def std(self, ddof=0):
+        return float(np.sqrt(self.variance(ddof)))
+
+    def to_dict(self):
+        return {'type': 'moments', 'n': self.n, 'mean': self.mean, 'm2': self.m2,
+                'min': None if self.n == 0 else self.min, 'max': None if self.n == 0 else self.max}
+
+    @classmethod
+    def from_dict(cls, data):
+        moments = cls()
+        moments.n = data['n']
+        moments.mean = data['mean']
+        moments.m2 = data['m2']
+        moments.min = np.inf if data['min'] is None else data['min']
+        moments.max = -np.inf if data['max'] is None else data['max']
+        return moments
+
+class CoMoments:
+    """Paired moments of (x, y): means, M2 of each and the co-moment sum((x - mx) * (y - my))."""
+    def __init__(self):
+        self.n = 0
+        self.mean_x = 0.0
+        self.mean_y = 0.0
+        self.m2_x = 0.0
+        self.m2_y = 0.0
+        self.c_xy = 0.0
+
+    def update(self, x, y):
+        x = np.asarray(x, dtype=np.float64).ravel()
+        y = np.asarray(y, dtype=np.float64).ravel()
+        keep = np.isfinite(x) & np.isfinite(y)
+        x, y = x[keep], y[keep]
+        if len(x) == 0:
+            return self
+        batch = CoMoments()
+        batch.n = len(x)
+        batch.mean_x, batch.mean_y = float(x.mean()), float(y.mean())
+        dx, dy = x - batch.mean_x, y - batch.mean_y
+        batch.m2_x, batch.m2_y, batch.c_xy = float((dx * dx).sum()), float((dy * dy).sum()), float((dx * dy).sum())
+        return self.merge(batch)
+
+    def merge(self, other):
+        if other.n == 0:
+            return self
+        n = self.n + other.n
+        dx = other.mean_x - self.mean_x
+        dy = other.mean_y - self.mean_y
+        weight = self.n * other.n / n
+        self.m2_x += other.m2_x + dx * dx * weight
+        self.m2_y += other.m2_y + dy * dy * weight
+        self.c_xy += other.c_xy + dx * dy * weight
+        self.mean_x += dx * other.n / n
+        self.mean_y += dy * other.n / n
+        self.n = n
+        return self
+
+    def slope_through_origin(self):
+        """sum(x * y) / sum(x * x), i.e. the least-squares y = slope * x."""
+        sum_xx = self.m2_x + self.n * self.mean_x ** 2
+        sum_xy = self.c_xy + self.n * self.mean_x * self.mean_y
+        return sum_xy / sum_xx if sum_xx > 0 else 0.0
+
+    def residual_moments(self, slope):
+        """Moments of y - slope * x (min / max are not tracked)."""
+        residual = Moments()
+        residual.n = self.n
+        residual.mean = self.mean_y - slope * self.mean_x
+        residual.m2 = max(self.m2_y - 2 * slope * self.c_xy + slope * slope * self.m2_x, 0.0)
+        return residual
+
+    def to_dict(self):
+        return {'type': 'comoments', 'n': self.n, 'mean_x': self.mean_x, 'mean_y': self.mean_y,
+                'm2_x': self.m2_x, 'm2_y': self.m2_y, 'c_xy': self.c_xy}
+
+    @classmethod
+    def from_dict(cls, data):
+        comoments = cls()
+        for key in ('n', 'mean_x', 'mean_y', 'm2_x', 'm2_y', 'c_xy'):
+            setattr(comoments, key, data[key])
+        return comoments
+
+class MetricSketch:
+    """Quantiles and moments of one metric."""
+    def __init__(self, k=KLL_K, seed=0):
+        self.kll = KLLSketch(k, seed)
+        self.moments = Moments()
+
+    @property
+    def n(self):
+        return self.moments.n
+
+    def update(self, values):
+        self.kll.update(values)
+        self.moments.update(values)
+        return self
+
+    def merge(self, other):
+        self.kll.merge(other.kll)
+        self.moments.merge(other.moments)
+        return self
+
+    def median(self):
+        return self.kll.median()
+
+    def mad(self):
+        return self.kll.mad()
+
+    def to_dict(self):
+        return {'type': 'metric', 'kll': self.kll.to_dict(), 'moments': self.moments.to_dict()}
+
+    @classmethod
+    def from_dict(cls, data):
+        sketch = cls()
+        sketch.kll = KLLSketch.from_dict(data['kll'])
+        sketch.moments = Moments.from_dict(data['moments'])
+        return sketch
+
+SKETCH_TYPES = {'kll': KLLSketch, 'moments': Moments, 'comoments': CoMoments, 'metric': MetricSketch}
+
+def sketch_from_dict(data):
+    return SKETCH_TYPES[data['type']].from_dict(data)
+
+def dumps(sketch):
+    return json.dumps(sketch.to_dict(), separators=(',', ':'))
+
+def loads(text_value):
+    return sketch_from_dict(json.loads(text_value))
+
+def merge_all(sketches):
+    """Merges a list of same-type sketches into a new one (the inputs are untouched)."""
+    sketches = list(sketches)
+    if not sketches:
+        return None
+    merged = sketch_from_dict(sketches[0].to_dict())
+    for sketch in sketches[1:]:
+        merged.merge(sketch)
+    return merged
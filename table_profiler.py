@@ -0,0 +1,294 @@
+
+import re
+import zlib
+import sys
+import json
+import argparse
+import numpy as np
+import pandas as pd
+from sqlalchemy import text
+from insighted_db import get_engine, stream_copy
+
+# Streaming column profiler for data-quality monitoring.
+# One pass over a table in chunks (server-side cursor), bounded memory per column:
+#   null / zero / blank rates, HyperLogLog distinct estimate, min / max,
+#   approximate quantiles (reservoir sample) and top-k values (Misra-Gries).
+# Profiles are stored in table_profiles; columns that are (almost) always
+# NULL/zero/blank are marked effectively_unused (a zero is any value that
+# parses as the number 0, so counts stored as text qualify), and columns that
+# only ever hold one value are marked constant.
+
+DEFAULT_TABLES = ['school_profiles', 'engineer_form', 'lgu_forms', 'lgu_projects', 'finance_projects']
+CHUNK_ROWS = 20000
+
+HLL_PRECISION = 12              # 4096 registers, ~1.6% standard error
+RESERVOIR_SIZE = 10000
+QUANTILES = [0.01, 0.05, 0.25, 0.5, 0.75, 0.95, 0.99]
+TOP_K = 10
+TOP_K_CAPACITY = TOP_K * 20     # counters kept by Misra-Gries
+
+# A column is effectively unused when this share of rows is NULL, zero or blank
+UNUSED_THRESHOLD = 0.99
+
+IDENTIFIER = re.compile(r'^[A-Za-z_][A-Za-z0-9_]*$')
+
+# --- SKETCHES ---
+
+class HyperLogLog:
+    def __init__(self, p=HLL_PRECISION):
+        self.p = p
+        self.m = 1 << p
+        self.registers = np.zeros(self.m, dtype=np.uint8)
+
+    def add_hashes(self, hashes):
+        """hashes: uint64 array (pd.util.hash_array of the values)."""
+        if len(hashes) == 0:
+            return
+        idx = (hashes >> np.uint64(64 - self.p)).astype(np.int64)
+        rest = hashes << np.uint64(self.p)
+        max_rank = 64 - self.p + 1
+        with np.errstate(divide='ignore'):
+            # Leading zeros of the remaining bits, +1
+            bit_length = np.where(rest > 0, np.floor(np.log2(rest.astype(np.float64))) + 1, 0)
+        rank = np.minimum(64 - bit_length + 1, max_rank).astype(np.uint8)
+        np.maximum.at(self.registers, idx, rank)
+
+    def merge(self, other):
+        np.maximum(self.registers, other.registers, out=self.registers)
+
+    def estimate(self):
+        m = self.m
+        alpha = 0.7213 / (1 + 1.079 / m)
+        raw = alpha * m * m / np.sum(np.power(2.0, -self.registers.astype(np.float64)))
+        zeros = int(np.count_nonzero(self.registers == 0))
+        if raw <= 2.5 * m and zeros:
+            return int(round(m * np.log(m / zeros)))   # linear counting for small cardinalities
+        return int(round(raw))
+
+class Reservoir:
+    """Uniform sample of a stream (Algorithm R, applied a chunk at a time)."""
+    def __init__(self, size=RESERVOIR_SIZE, seed=0):
+        self.size = size
+        self.seen = 0
+        self.sample = np.empty(0, dtype=np.float64)
+        self.rng = np.random.default_rng(seed)
+
+    def add(self, values):
+        values = np.asarray(values, dtype=np.float64)
+        if len(values) == 0:
+            return
+        free = self.size - len(self.sample)
+        if free > 0:
+            self.sample = np.concatenate([self.sample, values[:free]])
+            self.seen += min(free, len(values))
+            values = values[free:]
+        if len(values) == 0:
+            return
+        # Item number t (1-based) replaces a random slot with probability size/t
+        positions = self.seen + np.arange(1, len(values) + 1)
+        slots = (self.rng.random(len(values)) * positions).astype(np.int64)
+        keep = slots < self.size
+        # Later items win when two land on the same slot, as in the sequential algorithm
+        self.sample[slots[keep]] = values[keep]
+        self.seen += len(values)
+
+    def quantiles(self, qs=QUANTILES):
+        if len(self.sample) == 0:
+            return {}
+        return {str(q): float(v) for q, v in zip(qs, np.quantile(self.sample, qs))}
+
+class MisraGries:
+    """Heavy hitters with at most `capacity` counters; counts are lower bounds."""
+    def __init__(self, capacity=TOP_K_CAPACITY):
+        self.capacity = capacity
+        self.counts = {}
+
+    def add_counts(self, value_counts):
+        for value, count in value_counts.items():
+            self.counts[value] = self.counts.get(value, 0) + int(count)
+        if len(self.counts) > self.capacity:
+            # Subtract the (capacity+1)-th largest count from everyone, drop non-positive
+            cut = sorted(self.counts.values(), reverse=True)[self.capacity]
+            self.counts = {v: c - cut for v, c in self.counts.items() if c > cut}
+
+    def top(self, k=TOP_K):
+        return sorted(self.counts.items(), key=lambda x: x[1], reverse=True)[:k]
+
+# --- COLUMN PROFILE ---
+
+class ColumnProfile:
+    def __init__(self, name):
+        self.name = name
+        self.dtype = None
+        self.rows = 0
+        self.nulls = 0
+        self.zeros = 0
+        self.blanks = 0
+        self.min = None
+        self.max = None
+        self.hll = HyperLogLog()
+        self.reservoir = Reservoir(seed=zlib.crc32(name.encode("utf-8")))
+        self.top = MisraGries()
+
+    def update(self, series):
+        self.rows += len(series)
+        non_null = series.dropna()
+        self.nulls += len(series) - len(non_null)
+        if non_null.empty:
+            return
+
+        numeric = pd.api.types.is_numeric_dtype(non_null) and not pd.api.types.is_bool_dtype(non_null)
+        if self.dtype is None or self.dtype == 'empty':
+            self.dtype = 'numeric' if numeric else ('bool' if pd.api.types.is_bool_dtype(non_null) else 'other')
+
+        if numeric:
+            values = non_null.astype(np.float64)
+            self.zeros += int((values == 0).sum())
+            self.reservoir.add(values.to_numpy())
+            lo, hi = values.min(), values.max()
+        else:
+            as_text = non_null.astype(str)
+            stripped = as_text.str.strip()
+            self.blanks += int((stripped == '').sum())
+            if not pd.api.types.is_bool_dtype(non_null):
+                # Numeric counts stored in text columns ('0', '0.0')
+                self.zeros += int((pd.to_numeric(stripped, errors='coerce') == 0).sum())
+            try:
+                lo, hi = non_null.min(), non_null.max()
+            except TypeError:
+                lo, hi = as_text.min(), as_text.max()
+        self.min = lo if self.min is None else min(self.min, lo)
+        self.max = hi if self.max is None else max(self.max, hi)
+
+        self.hll.add_hashes(pd.util.hash_array(non_null.astype(str).to_numpy()))
+        self.top.add_counts(non_null.astype(str).value_counts(sort=False))
+
+    def result(self):
+        rows = self.rows or 1
+        empty = self.nulls + self.zeros + self.blanks
+        distinct = self.hll.estimate() if self.rows > self.nulls else 0
+        return {
+            'column_name': self.name,
+            'dtype': self.dtype or 'empty',
+            'row_count': self.rows,
+            'null_count': self.nulls,
+            'zero_count': self.zeros,
+            'blank_count': self.blanks,
+            'null_rate': self.nulls / rows,
+            'zero_rate': self.zeros / rows,
+            'distinct_estimate': distinct,
+            'min_value': None if self.min is None else str(self.min),
+            'max_value': None if self.max is None else str(self.max),
+            'quantiles': self.reservoir.quantiles(),
+            'top_values': [[v, c] for v, c in self.top.top()],
+            'effectively_unused': self.rows == 0 or empty / rows >= UNUSED_THRESHOLD,
+            'constant': self.rows > self.nulls and distinct <= 1,
+        }
+
+# --- DRIVER ---
+
+def profile_table(table, chunksize=CHUNK_ROWS):
+    if not IDENTIFIER.match(table):
+        raise ValueError(f"Invalid table name: {table}")
+
+    print(f"\nProfiling {table} (chunks of {chunksize})...")
+    profiles = {}
+    rows = 0
+    for chunk in stream_copy(f'SELECT * FROM "{table}"', chunksize=chunksize):
+        for col in chunk.columns:
+            if col not in profiles:
+                profiles[col] = ColumnProfile(col)
+            profiles[col].update(chunk[col])
+        rows += len(chunk)
+        print(f"  ...{rows} rows")
+
+    return rows, [p.result() for p in profiles.values()]
+
+def ensure_profile_table(conn):
+    conn.execute(text("""
+        CREATE TABLE IF NOT EXISTS table_profiles (
+            table_name VARCHAR(100) NOT NULL,
+            column_name VARCHAR(100) NOT NULL,
+            dtype VARCHAR(20),
+            row_count INT,
+            null_count INT,
+            zero_count INT,
+            blank_count INT,
+            null_rate FLOAT,
+            zero_rate FLOAT,
+            distinct_estimate INT,
+            min_value TEXT,
+            max_value TEXT,
+            quantiles JSONB,
+            top_values JSONB,
+            effectively_unused BOOLEAN DEFAULT FALSE,
+            constant BOOLEAN DEFAULT FALSE,
+            profiled_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            PRIMARY KEY (table_name, column_name)
+        );
+    """))
+    conn.execute(text("ALTER TABLE table_profiles ADD COLUMN IF NOT EXISTS constant BOOLEAN DEFAULT FALSE"))
+
+def save_profiles(table, results):
+    rows = [dict(r, table_name=table, quantiles=json.dumps(r['quantiles']), top_values=json.dumps(r['top_values']))
+            for r in results]
+    with get_engine().begin() as conn:
+        ensure_profile_table(conn)
+        # Latest profile per column; columns dropped since the last run disappear
+        conn.execute(text("DELETE FROM table_profiles WHERE table_name = :t"), {'t': table})
+        if rows:
+            conn.execute(text("""
+                INSERT INTO table_profiles (
+                    table_name, column_name, dtype, row_count, null_count, zero_count, blank_count,
+                    null_rate, zero_rate, distinct_estimate, min_value, max_value,
+                    quantiles, top_values, effectively_unused, constant, profiled_at
+                ) VALUES (
+                    :table_name, :column_name, :dtype, :row_count, :null_count, :zero_count, :blank_count,
+                    :null_rate, :zero_rate, :distinct_estimate, :min_value, :max_value,
+                    CAST(:quantiles AS JSONB), CAST(:top_values AS JSONB), :effectively_unused, :constant, CURRENT_TIMESTAMP
+                )
+            """), rows)
+
+def print_profiles(table, rows, results, show_all=False):
+    unused = [r for r in results if r['effectively_unused']]
+    constant = [r for r in results if r['constant'] and not r['effectively_unused']]
+    print(f"\n=== {table}: {rows:,} rows, {len(results)} columns, {len(unused)} effectively unused, "
+          f"{len(constant)} constant ===")
+    shown = results if show_all else unused + constant
+    for r in shown:
+        top = ", ".join(f"{v}({c})" for v, c in r['top_values'][:3])
+        mark = "unused" if r['effectively_unused'] else ("constant" if r['constant'] else "")
+        print(f"  {r['column_name']:<40} {mark:<8} null {r['null_rate']:6.1%}  zero {r['zero_rate']:6.1%}  "
+              f"distinct ~{r['distinct_estimate']:<7} min {r['min_value']}  max {r['max_value']}  top {top}")
+
+def main():
+    parser = argparse.ArgumentParser(description='Stream tables and profile every column')
+    parser.add_argument('tables', nargs='*', default=DEFAULT_TABLES, help='Tables to profile')
+    parser.add_argument('--chunksize', type=int, default=CHUNK_ROWS, help='Rows per streamed chunk')
+    parser.add_argument('--no-save', action='store_true', help='Print only, do not write table_profiles')
+    parser.add_argument('--all', action='store_true', help='Print every column, not just the unused and constant ones')
+    parser.add_argument('--json', type=str, help='Also write the profiles as JSON to this path')
+    args = parser.parse_args()
+
+    report = {}
+    for table in args.tables:
+        try:
+            rows, results = profile_table(table, args.chunksize)
+        except Exception as e:
+            print(f"Error profiling {table}: {e}")
+            continue
+
+        print_profiles(table, rows, results, args.all)
+        report[table] = results
+        if not args.no_save:
+            save_profiles(table, results)
+            print(f"Saved {len(results)} column profiles for {table}.")
+
+    if args.json:
+        with open(args.json, 'w', encoding='utf-8') as f:
+            json.dump(report, f, indent=2, default=str)
+
+    sys.exit(0 if report else 1)
+
+if __name__ == "__main__":
+    main()
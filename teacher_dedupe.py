@@ -0,0 +1,403 @@
+
+import sys
+import argparse
+import numpy as np
+import pandas as pd
+from sqlalchemy import text
+from insighted_db import get_engine, stream_copy
+
+# Teacher record deduplication for teachers_list (the masterlist the roster is
+# copied from). The same teacher under two control numbers, or with reordered
+# or misspelled names, is found without an all-pairs comparison:
+#   1. blocking   candidate pairs only within blocks (same surname + first name,
+#                 same school + first initial, same school + name tokens, and
+#                 same surname + first initial + birth date when a birth date exists)
+#   2. scoring    edit similarity per name part (surname vs surname, first name
+#                 vs first name; an adjacent transposition counts as one edit),
+#                 also tried with first and last swapped; a token-sorted full
+#                 name that is identical counts as the same name (reordered
+#                 parts). Vectorized over all candidate pairs.
+#   3. clustering union-find over matched pairs; the smallest control_num is canonical
+# Matched pairs go to teacher_duplicate_review (reviewer status is kept across
+# runs; pairs marked 'distinct' are never merged again). A match is confirmed
+# when it is in the same school, shares a birth date, or a reviewer marked it
+# 'duplicate'; the non-canonical members of confirmed clusters are listed in
+# teacher_duplicate_records, which roster counts exclude. Same-name records in
+# different schools stay 'pending' until reviewed (namesakes are common).
+
+CHUNK_ROWS = 50000
+MAX_BLOCK = 400             # larger blocks are split by middle initial, then skipped
+# Similarity = 1 - (edits in first + edits in last) / (longer first + longer last),
+# so one typo in a 10-letter name scores 0.90
+NAME_MATCH = 0.92
+NAME_MATCH_SAME_BIRTH = 0.75
+NAME_MATCH_SAME_SCHOOL = 0.88
+NAME_PART_MIN = 0.75        # each part on its own (MARK / MARY 0.75, REYES / REYNA 0.60)
+EDIT_CHUNK_PAIRS = 200000
+
+# teachers_list column names differ between masterlist imports
+COLUMN_CANDIDATES = {
+    'control_num': ['control_num', 'control.num', 'control_number'],
+    'school_id': ['school.id', 'school_id'],
+    'first': ['first.name', 'first', 'first_name'],
+    'middle': ['middle.name', 'middle', 'middle_name'],
+    'last': ['last.name', 'last', 'last_name'],
+    'birth': ['birth.date', 'birthdate', 'birth_date', 'date.of.birth', 'birthday'],
+    'position': ['position'],
+}
+
+SUFFIXES = {'JR', 'SR', 'II', 'III', 'IV', 'V'}
+
+# --- LOADING / NORMALIZATION ---
+
+def resolve_columns(columns):
+    resolved = {}
+    for key, candidates in COLUMN_CANDIDATES.items():
+        resolved[key] = next((c for c in candidates if c in columns), None)
+    missing = [k for k in ('control_num', 'school_id', 'first', 'last') if resolved[k] is None]
+    if missing:
+        raise ValueError(f"teachers_list is missing required column(s): {', '.join(missing)}")
+    return resolved
+
+def normalize_name(series):
+    """Upper-case letters only, single spaces, suffixes (JR, III, ...) removed."""
+    cleaned = (series.fillna('').astype(str).str.upper()
+               .str.normalize('NFKD').str.encode('ascii', 'ignore').str.decode('ascii')
+               .str.replace(r'[^A-Z ]', ' ', regex=True)
+               .str.replace(r'\s+', ' ', regex=True).str.strip())
+    suffix_re = r'\b(?:' + '|'.join(SUFFIXES) + r')\b'
+    return cleaned.str.replace(suffix_re, '', regex=True).str.replace(r'\s+', ' ', regex=True).str.strip()
+
+def load_teachers(chunksize=CHUNK_ROWS):
+    frames = []
+    cols = None
+    for chunk in stream_copy('SELECT * FROM teachers_list', chunksize=chunksize):
+        if cols is None:
+            cols = resolve_columns(chunk.columns)
+        frames.append(prepare_teachers(chunk, cols))
+        print(f"  ...{sum(len(f) for f in frames)} teacher rows")
+    return pd.concat(frames, ignore_index=True) if frames else pd.DataFrame()
+
+def prepare_teachers(raw, cols):
+    df = pd.DataFrame({
+        'control_num': raw[cols['control_num']].astype(str).str.strip(),
+        'school_id': raw[cols['school_id']].astype(str).str.strip(),
+        'first': normalize_name(raw[cols['first']]),
+        'middle': normalize_name(raw[cols['middle']]) if cols['middle'] else '',
+        'last': normalize_name(raw[cols['last']]),
+        'position': raw[cols['position']].astype(str) if cols['position'] else None,
+    })
+    if cols['birth']:
+        df['birth'] = pd.to_datetime(raw[cols['birth']], errors='coerce').dt.strftime('%Y-%m-%d')
+    else:
+        df['birth'] = None
+
+    df['first_token'] = df['first'].str.split(' ').str[0].fillna('')
+    df['first_initial'] = df['first'].str[:1]
+    df['initials'] = [''.join(sorted(f[:1] + l[:1])) for f, l in zip(df['first'], df['last'])]
+    df['middle_initial'] = df['middle'].str[:1] if cols['middle'] else ''
+    # Token-sorted full name: "CRUZ JUAN DELA" == "JUAN DELA CRUZ"
+    full = (df['first'] + ' ' + df['middle'] + ' ' + df['last']).str.split()
+    df['name_key'] = full.apply(lambda tokens: ' '.join(sorted(tokens)))
+    df['display_name'] = (df['first'] + ' ' + df['middle'] + ' ' + df['last']).str.replace(r'\s+', ' ', regex=True).str.strip()
+    return df[(df['control_num'] != '') & (df['name_key'] != '')]
+
+# --- BLOCKING ---
+
+def block_pairs(df, keys, stats):
+    """Candidate (i, j) positional pairs, i < j, from rows sharing all `keys`."""
+    key = df[keys[0]].astype(str)
+    for col in keys[1:]:
+        key = key + '|' + df[col].astype(str)
+    out = []
+    for members in pd.Series(np.arange(len(df))).groupby(key.to_numpy()).indices.values():
+        if len(members) < 2:
+            continue
+        if len(members) > MAX_BLOCK:
+            # Split an oversized block by middle initial; give up if still too large
+            sub = df['middle_initial'].to_numpy()[members]
+            for part in pd.Series(members).groupby(sub).groups.values():
+                part = members[np.asarray(part)]
+                if 2 <= len(part) <= MAX_BLOCK:
+                    out.append(part)
+                elif len(part) > MAX_BLOCK:
+                    stats['skipped_blocks'] += 1
+            continue
+        out.append(members)
+
+    pairs = [np.column_stack([m[i], m[j]]) for m in out for i, j in [np.triu_indices(len(m), k=1)]]
+    return np.vstack(pairs) if pairs else np.empty((0, 2), dtype=np.int64)
+
+def candidate_pairs(df):
+    stats = {'skipped_blocks': 0}
+    blocks = [
+        ['last', 'first_token'],            # same person, other control number / school
+        ['school_id', 'first_initial'],     # misspelled surname within a school
+        ['school_id', 'name_key'],          # reordered names within a school
+        ['school_id', 'initials'],          # first and last swapped, one misspelled
+        ['name_key'],                       # reordered names across schools
+    ]
+    if df['birth'].notna().any():
+        blocks.append(['last', 'first_initial', 'birth'])
+    pairs = np.vstack([block_pairs(df, keys, stats) for keys in blocks])
+    pairs = np.unique(np.sort(pairs, axis=1), axis=0)
+    # Same control number is already handled by ON CONFLICT (control_num)
+    control = df['control_num'].to_numpy()
+    pairs = pairs[control[pairs[:, 0]] != control[pairs[:, 1]]]
+    return pairs, stats
+
+# --- SCORING ---
+
+def char_codes(names, width):
+    """(rows x width) uint8 character codes, 0-padded."""
+    codes = np.zeros((len(names), width), dtype=np.uint8)
+    for r, name in enumerate(names):
+        raw = np.frombuffer(name[:width].encode('ascii', 'ignore'), dtype=np.uint8)
+        codes[r, :len(raw)] = raw
+    return codes
+
+def edit_distance(left, right):
+    """
+    Optimal string alignment distance (Levenshtein plus adjacent transpositions)
+    of each (left[k], right[k]) pair; one dynamic-programming cell at a time for
+    every pair at once.
+    """
+    n = len(left)
+    len_a = np.fromiter((len(x) for x in left), dtype=np.int64, count=n)
+    len_b = np.fromiter((len(x) for x in right), dtype=np.int64, count=n)
+    width = int(max(len_a.max(initial=0), len_b.max(initial=0)))
+    distance = len_b.copy()                 # empty left: insert everything
+    if width == 0:
+        return distance
+    a, b = char_codes(left, width), char_codes(right, width)
+    rows = np.arange(n)
+
+    before = np.zeros((n, width + 1), dtype=np.int64)
+    prev = np.tile(np.arange(width + 1), (n, 1))
+    for i in range(1, width + 1):
+        cur = np.empty_like(prev)
+        cur[:, 0] = i
+        for j in range(1, width + 1):
+            cost = (a[:, i - 1] != b[:, j - 1]).astype(np.int64)
+            cell = np.minimum(np.minimum(prev[:, j] + 1, cur[:, j - 1] + 1), prev[:, j - 1] + cost)
+            if i > 1 and j > 1:
+                swapped = (a[:, i - 1] == b[:, j - 2]) & (a[:, i - 2] == b[:, j - 1])
+                cell = np.where(swapped, np.minimum(cell, before[:, j - 2] + 1), cell)
+            cur[:, j] = cell
+        done = len_a == i
+        distance[done] = cur[rows[done], len_b[done]]
+        before, prev = prev, cur
+    return distance
+
+def name_similarity(first_a, last_a, first_b, last_b):
+    """1 - total edits / total length of the longer parts; 0 when either part is below NAME_PART_MIN."""
+    similarity = np.empty(len(first_a))
+    for start in range(0, len(first_a), EDIT_CHUNK_PAIRS):
+        part = slice(start, start + EDIT_CHUNK_PAIRS)
+        edits, longest, part_ok = 0, 0, True
+        for a, b in ((first_a[part], first_b[part]), (last_a[part], last_b[part])):
+            d = edit_distance(a, b)
+            longer = np.maximum([len(x) for x in a], [len(x) for x in b])
+            part_ok = part_ok & (1 - d / np.maximum(longer, 1) >= NAME_PART_MIN)
+            edits, longest = edits + d, longest + longer
+        similarity[part] = np.where(part_ok, 1 - edits / np.maximum(longest, 1), 0.0)
+    return similarity
+
+def score_pairs(df, pairs):
+    i, j = pairs[:, 0], pairs[:, 1]
+    first, last = df['first'].to_numpy(), df['last'].to_numpy()
+    straight = name_similarity(first[i], last[i], first[j], last[j])
+    # First and last name entered in each other's fields
+    crossed = name_similarity(first[i], last[i], last[j], first[j])
+    name_key = df['name_key'].to_numpy()
+    similarity = np.where(name_key[i] == name_key[j], 1.0, np.maximum(straight, crossed))
+
+    birth = df['birth'].to_numpy()
+    same_birth = pd.notna(birth[i]) & (birth[i] == birth[j])
+    same_school = df['school_id'].to_numpy()[i] == df['school_id'].to_numpy()[j]
+    middle = df['middle_initial'].to_numpy()
+    middle_conflict = (middle[i] != '') & (middle[j] != '') & (middle[i] != middle[j])
+
+    matched = (similarity >= NAME_MATCH) | (same_birth & (similarity >= NAME_MATCH_SAME_BIRTH)) \
+        | (same_school & (similarity >= NAME_MATCH_SAME_SCHOOL))
+    # A different middle initial is a different person unless the birth date agrees
+    matched &= ~middle_conflict | same_birth
+
+    reason = np.select(
+        [similarity >= 0.999, same_birth, same_school],
+        ['same name', 'similar name, same birth date', 'similar name, same school'],
+        default='similar name'
+    )
+    confirmed = same_school | same_birth
+    return pd.DataFrame({'i': i, 'j': j, 'similarity': similarity, 'reason': reason, 'confirmed': confirmed})[matched]
+
+# --- CLUSTERING ---
+
+def cluster_matches(df, matches):
+    parent = np.arange(len(df))
+    def find(x):
+        while parent[x] != x:
+            parent[x] = parent[parent[x]]
+            x = parent[x]
+        return x
+    for x, y in zip(matches['i'].to_numpy(), matches['j'].to_numpy()):
+        rx, ry = find(x), find(y)
+        if rx != ry:
+            parent[max(rx, ry)] = min(rx, ry)
+
+    roots = np.array([find(x) for x in range(len(df))])
+    clusters = pd.DataFrame({'root': roots, 'control_num': df['control_num'].to_numpy(),
+                             'school_id': df['school_id'].to_numpy()})
+    sizes = clusters.groupby('root')['root'].transform('size')
+    clusters = clusters[sizes > 1].copy()
+    clusters['canonical_control_num'] = clusters.groupby('root')['control_num'].transform('min')
+    clusters['cluster_id'] = clusters['canonical_control_num']
+    return clusters
+
+# --- PERSISTENCE ---
+
+def ensure_dedupe_tables(conn):
+    conn.execute(text("""
+        CREATE TABLE IF NOT EXISTS teacher_duplicate_review (
+            control_num_a VARCHAR(50) NOT NULL,
+            control_num_b VARCHAR(50) NOT NULL,
+            cluster_id VARCHAR(50),
+            school_id_a VARCHAR(50),
+            school_id_b VARCHAR(50),
+            name_a TEXT,
+            name_b TEXT,
+            similarity FLOAT,
+            reason VARCHAR(50),
+            status VARCHAR(20) NOT NULL DEFAULT 'pending',   -- pending / duplicate / distinct
+            detected_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            reviewed_at TIMESTAMP,
+            PRIMARY KEY (control_num_a, control_num_b)
+        );
+
+        CREATE TABLE IF NOT EXISTS teacher_duplicate_records (
+            control_num VARCHAR(50) PRIMARY KEY,
+            school_id VARCHAR(50),
+            cluster_id VARCHAR(50) NOT NULL,
+            canonical_control_num VARCHAR(50) NOT NULL,
+            detected_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        );
+        CREATE INDEX IF NOT EXISTS idx_teacher_duplicate_records_school
+            ON teacher_duplicate_records (school_id);
+    """))
+
+def load_review_decisions(engine):
+    """{(control_num_a, control_num_b): 'duplicate' | 'distinct'} from earlier reviews."""
+    try:
+        rows = pd.read_sql("""
+            SELECT control_num_a, control_num_b, status FROM teacher_duplicate_review
+            WHERE status IN ('duplicate', 'distinct')
+        """, engine)
+    except Exception:
+        return {}
+    return dict(zip(zip(rows['control_num_a'], rows['control_num_b']), rows['status']))
+
+def save_results(engine, df, matches, clusters, duplicates):
+    control = df['control_num'].to_numpy()
+    a = control[matches['i'].to_numpy()]
+    b = control[matches['j'].to_numpy()]
+    swap = a > b
+    root_of = dict(zip(clusters['control_num'], clusters['cluster_id']))
+    review = [
+        {'a': ca, 'b': cb, 'cluster_id': root_of.get(ca),
+         'school_a': df['school_id'].iat[ia], 'school_b': df['school_id'].iat[ib],
+         'name_a': df['display_name'].iat[ia], 'name_b': df['display_name'].iat[ib],
+         'similarity': float(sim), 'reason': reason}
+        for ca, cb, ia, ib, sim, reason in zip(
+            np.where(swap, b, a), np.where(swap, a, b),
+            np.where(swap, matches['j'], matches['i']), np.where(swap, matches['i'], matches['j']),
+            matches['similarity'], matches['reason'])
+    ]
+    records = [
+        {'control_num': r.control_num, 'school_id': r.school_id, 'cluster_id': r.cluster_id,
+         'canonical_control_num': r.canonical_control_num}
+        for r in duplicates.itertuples(index=False) if r.control_num != r.canonical_control_num
+    ]
+
+    with engine.begin() as conn:
+        ensure_dedupe_tables(conn)
+        if review:
+            # Reviewer decisions survive re-runs; only the detection fields refresh
+            conn.execute(text("""
+                INSERT INTO teacher_duplicate_review (
+                    control_num_a, control_num_b, cluster_id, school_id_a, school_id_b,
+                    name_a, name_b, similarity, reason, detected_at
+                ) VALUES (:a, :b, :cluster_id, :school_a, :school_b, :name_a, :name_b, :similarity, :reason, CURRENT_TIMESTAMP)
+                ON CONFLICT (control_num_a, control_num_b) DO UPDATE SET
+                    cluster_id = EXCLUDED.cluster_id,
+                    name_a = EXCLUDED.name_a,
+                    name_b = EXCLUDED.name_b,
+                    similarity = EXCLUDED.similarity,
+                    reason = EXCLUDED.reason,
+                    detected_at = CURRENT_TIMESTAMP
+            """), review)
+        conn.execute(text("DELETE FROM teacher_duplicate_records"))
+        if records:
+            conn.execute(text("""
+                INSERT INTO teacher_duplicate_records (control_num, school_id, cluster_id, canonical_control_num, detected_at)
+                VALUES (:control_num, :school_id, :cluster_id, :canonical_control_num, CURRENT_TIMESTAMP)
+            """), records)
+    return len(review), len(records)
+
+# --- DRIVER ---
+
+def find_duplicates(df, decisions=None):
+    """
+    Returns (df, matches, clusters, duplicates): clusters group every matched
+    pair (for review); duplicates group only the confirmed ones.
+    """
+    df = df.drop_duplicates('control_num').reset_index(drop=True)
+    pairs, stats = candidate_pairs(df)
+    print(f"{len(df):,} teachers -> {len(pairs):,} candidate pairs "
+          f"(vs {len(df) * (len(df) - 1) // 2:,} all-pairs)"
+          + (f", {stats['skipped_blocks']} oversized block(s) skipped" if stats['skipped_blocks'] else ""))
+
+    matches = score_pairs(df, pairs) if len(pairs) else \
+        pd.DataFrame({'i': [], 'j': [], 'similarity': [], 'reason': [], 'confirmed': []})
+    if decisions and not matches.empty:
+        control = df['control_num'].to_numpy()
+        a, b = control[matches['i'].to_numpy()], control[matches['j'].to_numpy()]
+        status = pd.Series([decisions.get((min(x, y), max(x, y))) for x, y in zip(a, b)], index=matches.index)
+        matches = matches[status != 'distinct']
+        matches.loc[status[status != 'distinct'] == 'duplicate', 'confirmed'] = True
+
+    clusters = cluster_matches(df, matches)
+    duplicates = cluster_matches(df, matches[matches['confirmed'].astype(bool)])
+    print(f"{len(matches):,} matched pair(s) in {clusters['cluster_id'].nunique():,} cluster(s); "
+          f"{len(duplicates) - duplicates['cluster_id'].nunique():,} confirmed duplicate record(s).")
+    return df, matches, clusters, duplicates
+
+def main():
+    parser = argparse.ArgumentParser(description='Find duplicate teacher records in teachers_list')
+    parser.add_argument('--no-save', action='store_true', help='Print only, do not write the review tables')
+    parser.add_argument('--show', type=int, default=20, help='Print this many matched pairs')
+    args = parser.parse_args()
+
+    engine = get_engine()
+    print("Loading teachers_list...")
+    try:
+        teachers = load_teachers()
+    except Exception as e:
+        print(f"Error loading teachers_list: {e}")
+        sys.exit(1)
+    if teachers.empty:
+        print("teachers_list is empty.")
+        return
+
+    df, matches, clusters, duplicates = find_duplicates(teachers, load_review_decisions(engine))
+
+    for m in matches.sort_values('similarity').head(args.show).itertuples(index=False):
+        a, b = df.iloc[m.i], df.iloc[m.j]
+        print(f"  {a.control_num} {a.display_name} ({a.school_id})  ~  {b.control_num} {b.display_name} ({b.school_id})"
+              f"  {m.similarity:.2f}  {m.reason}{'' if m.confirmed else '  (pending review)'}")
+
+    if not args.no_save:
+        pairs_saved, records = save_results(engine, df, matches, clusters, duplicates)
+        print(f"Saved {pairs_saved} pair(s) for review and {records} duplicate record(s).")
+
+if __name__ == "__main__":
+    main()
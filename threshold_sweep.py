@@ -0,0 +1,191 @@
+
+import os
+import sys
+import time
+import argparse
+import itertools
+import numpy as np
+import pandas as pd
+from insighted_db import get_engine, copy_sql
+import advanced_fraud_detection as afd
+
+# Threshold / penalty sweep for the school_summary health scoring.
+# Ratios, z-scores and residual z-scores are computed once (through the same
+# scoring functions the pipeline uses) and cached; every configuration in the
+# grid is then evaluated in one broadcast NumPy pass over (schools x configs).
+# Flags that do not depend on a threshold here (zero values, experience
+# mismatch, phase-1 delta/clone/roster flags) are counted as they are.
+
+CACHE_PATH = os.path.join(os.path.dirname(afd.EXPORT_DIR), "threshold_sweep_cache.npz")
+CONFIG_CHUNK_SCHOOLS = 5000
+
+PARAMETERS = {
+    'outlier_z': afd.OUTLIER_Z_THRESHOLD,
+    'anomaly_z': afd.ANOMALY_Z_THRESHOLD,
+    'peer_z': afd.PEER_Z_THRESHOLD,
+    'zero_penalty': afd.ZERO_FLAG_PENALTY,
+    'other_penalty': afd.OTHER_FLAG_PENALTY,
+    'missing_key_cap': afd.MISSING_KEY_RESOURCE_CAP,
+    'good_min': afd.GOOD_SCORE_MIN,
+    'fair_min': afd.FAIR_SCORE_MIN,
+}
+DESCRIPTIONS = ["Excellent", "Good", "Fair", "Critical"]
+
+# --- CACHE ---
+
+def build_cache(path=CACHE_PATH):
+    """Scores school_summary once against the persisted stats and keeps the arrays the sweep needs."""
+    engine = get_engine(readonly=True)
+    stats = afd.load_scoring_stats(engine)
+    print("Loading school_summary...")
+    df = copy_sql("SELECT * FROM school_summary", readonly=True, chunksize=20000)
+    if df.empty:
+        raise RuntimeError("school_summary is empty.")
+    print(f"Scoring {len(df)} schools once" + (f" against stats from {stats['computed_at']}" if stats else " (fitting stats)") + "...")
+    df, _ = afd.score_school_summary(df, stats, verbose=False)
+
+    cache = cache_arrays(df)
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+    np.savez_compressed(path, **cache)
+    print(f"Cached {len(df)} schools to {os.path.abspath(path)}")
+    return cache
+
+def cache_arrays(df):
+    """Threshold-independent inputs of the sweep, from a scored school_summary frame."""
+    ratio_z = np.column_stack([df[f'z_{r}'].to_numpy(dtype=float) for r in afd.RATIO_DENOMINATORS])
+    anomaly_z = np.column_stack([df[f'z_resid_{m}'].to_numpy(dtype=float) for m in afd.ANOMALY_METRICS.values()])
+    peer_z = np.column_stack([df[f'z_peer_{m}'].to_numpy(dtype=float) for m in afd.PEER_METRICS.values()])
+
+    swept = {f'flag_outlier_{r}' for r in afd.RATIO_DENOMINATORS} \
+        | {f'flag_anomaly_{m}' for m in afd.ANOMALY_METRICS.values()} \
+        | {f'flag_peer_{m}' for m in afd.PEER_METRICS.values()}
+    zero_flags = [c for c in df.columns if c.startswith('flag_zero_')]
+    fixed_other = [c for c in df.columns if c.startswith('flag_') and not c.startswith('flag_zero_') and c not in swept]
+
+    existing_crit = [c for c in afd.CRITICAL_TOTALS if c in df.columns]
+    has_learners = (df['total_learners'].fillna(0) > 0).to_numpy()
+    return {
+        'ratio_z': ratio_z,
+        'anomaly_z': anomaly_z,
+        'peer_z': peer_z,
+        'zero_count': df[zero_flags].fillna(False).astype(bool).sum(axis=1).to_numpy(),
+        'fixed_other_count': df[fixed_other].fillna(False).astype(bool).sum(axis=1).to_numpy(),
+        'missing_key': (df['flag_zero_teachers'] | df['flag_zero_classrooms']).to_numpy(dtype=bool),
+        'no_learners': ~has_learners,
+        'zero_totals': (df[existing_crit].to_numpy() == 0).any(axis=1) & has_learners,
+        'current_description': df['data_health_description'].astype(str).to_numpy(),
+    }
+
+def load_cache(path=CACHE_PATH, refresh=False):
+    if refresh or not os.path.exists(path):
+        return build_cache(path)
+    with np.load(path, allow_pickle=True) as data:
+        return {k: data[k] for k in data.files}
+
+# --- SWEEP ---
+
+def config_grid(ranges):
+    """Cartesian product of the given value lists; unspecified parameters keep the pipeline's value."""
+    names = list(PARAMETERS)
+    values = [ranges.get(name) or [PARAMETERS[name]] for name in names]
+    grid = pd.DataFrame(list(itertools.product(*values)), columns=names)
+    return grid[grid['good_min'] > grid['fair_min']].reset_index(drop=True)
+
+def count_exceeding(z, thresholds):
+    """(schools, configs) number of columns of z with |z| > threshold (NaN never exceeds)."""
+    abs_z = np.nan_to_num(np.abs(z), nan=-1.0)
+    return (abs_z[:, :, None] > thresholds[None, None, :]).sum(axis=1)
+
+def sweep(cache, grid):
+    """Evaluates every configuration; returns one summary row per configuration."""
+    n = len(cache['zero_count'])
+    c = len(grid)
+    g = {name: grid[name].to_numpy(dtype=float) for name in PARAMETERS}
+
+    outlier_total = np.zeros(c)
+    anomaly_total = np.zeros(c)
+    peer_total = np.zeros(c)
+    flagged_schools = np.zeros(c)
+    score_sum = np.zeros(c)
+    desc_counts = np.zeros((len(DESCRIPTIONS), c))
+
+    for start in range(0, n, CONFIG_CHUNK_SCHOOLS):
+        rows = slice(start, start + CONFIG_CHUNK_SCHOOLS)
+        outliers = count_exceeding(cache['ratio_z'][rows], g['outlier_z'])
+        anomalies = count_exceeding(cache['anomaly_z'][rows], g['anomaly_z'])
+        peers = count_exceeding(cache['peer_z'][rows], g['peer_z'])
+        zero = cache['zero_count'][rows][:, None]
+        other = outliers + anomalies + peers + cache['fixed_other_count'][rows][:, None]
+
+        score = np.maximum(100 - zero * g['zero_penalty'] - other * g['other_penalty'], 0)
+        capped = cache['missing_key'][rows][:, None] & (score > g['missing_key_cap'])
+        score = np.where(capped, g['missing_key_cap'], score)
+        score = np.where(cache['no_learners'][rows][:, None], 0, score)
+
+        excellent = score == 100
+        # Excellent with a zero critical total is reported as Good
+        downgraded = excellent & cache['zero_totals'][rows][:, None]
+        excellent &= ~downgraded
+        good = ~excellent & ((score >= g['good_min']) | downgraded)
+        fair = ~excellent & ~good & (score >= g['fair_min'])
+        critical = ~(excellent | good | fair)
+        score = np.where(downgraded, 99, score)
+
+        outlier_total += outliers.sum(axis=0)
+        anomaly_total += anomalies.sum(axis=0)
+        peer_total += peers.sum(axis=0)
+        flagged_schools += ((zero + other) > 0).sum(axis=0)
+        score_sum += score.sum(axis=0)
+        for k, mask in enumerate([excellent, good, fair, critical]):
+            desc_counts[k] += mask.sum(axis=0)
+
+    result = grid.copy()
+    result['outlier_flags'] = outlier_total.astype(int)
+    result['anomaly_flags'] = anomaly_total.astype(int)
+    result['peer_flags'] = peer_total.astype(int)
+    result['schools_flagged'] = flagged_schools.astype(int)
+    result['mean_score'] = score_sum / max(n, 1)
+    for k, desc in enumerate(DESCRIPTIONS):
+        result[desc.lower()] = desc_counts[k].astype(int)
+    result['is_current'] = np.all([grid[name] == value for name, value in PARAMETERS.items()], axis=0)
+    return result
+
+def parse_values(text_value):
+    return [float(v) for v in text_value.split(',') if v.strip()] if text_value else None
+
+def main():
+    parser = argparse.ArgumentParser(description='Evaluate many scoring threshold / penalty configurations at once')
+    for name, default in PARAMETERS.items():
+        parser.add_argument(f"--{name.replace('_', '-')}", type=str, help=f"Comma-separated values (pipeline: {default})")
+    parser.add_argument('--refresh', action='store_true', help='Rebuild the cached z-scores from the database')
+    parser.add_argument('--cache', type=str, default=CACHE_PATH, help='Cache file (.npz)')
+    parser.add_argument('--sort', type=str, default='critical', help='Column to sort the report by')
+    parser.add_argument('--top', type=int, default=40, help='Rows to print')
+    parser.add_argument('--csv', type=str, help='Write every configuration to this CSV')
+    args = parser.parse_args()
+
+    try:
+        cache = load_cache(args.cache, args.refresh)
+    except Exception as e:
+        print(f"Error preparing sweep cache: {e}")
+        sys.exit(1)
+
+    grid = config_grid({name: parse_values(getattr(args, name)) for name in PARAMETERS})
+    started = time.perf_counter()
+    result = sweep(cache, grid)
+    elapsed = time.perf_counter() - started
+    print(f"\nEvaluated {len(grid)} configuration(s) over {len(cache['zero_count'])} schools in {elapsed:.2f}s.")
+
+    current = pd.Series(cache['current_description']).value_counts()
+    print("Stored descriptions: " + " | ".join(f"{d} {int(current.get(d, 0))}" for d in DESCRIPTIONS))
+
+    shown = result.sort_values(args.sort, kind='stable').head(args.top)
+    with pd.option_context('display.width', 200, 'display.max_columns', None):
+        print(shown.to_string(index=False, float_format=lambda v: f"{v:g}"))
+
+    if args.csv:
+        result.to_csv(args.csv, index=False)
+        print(f"Wrote {len(result)} configurations to {args.csv}")
+
+if __name__ == "__main__":
+    main()
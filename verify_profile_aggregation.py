@@ -0,0 +1,78 @@
+
+import sys
+import argparse
+import numpy as np
+import pandas as pd
+from insighted_db import get_engine, copy_sql
+import advanced_fraud_detection as afd
+
+# Parity check for the SQL aggregation pushdown: the same sample of
+# school_profiles rows is aggregated by pandas (SELECT *, aggregate_profiles)
+# and by PostgreSQL (profile_aggregate_query), then imputed the same way.
+# Every aggregate, imputed value, summary total and per-grade flag must match exactly.
+# Both sides are read with COPY (copy_sql), as the pipeline reads them.
+
+def load_both(engine, school_ids):
+    params = {'ids': list(school_ids)}
+    where = " WHERE school_id = ANY(%(ids)s)"
+    raw = copy_sql("SELECT * FROM school_profiles" + where, params, readonly=True)
+    pushed = copy_sql(afd.profile_aggregate_query(afd.profile_column_types(engine)) + where, params, readonly=True)
+
+    pandas_df, _ = afd.clean_and_impute(raw.sort_values('school_id', ignore_index=True))
+    sql_df, _ = afd.clean_and_impute(pushed.sort_values('school_id', ignore_index=True), aggregated=True)
+    return pandas_df, sql_df
+
+def compared_columns(df):
+    imputed = [c for c in df.columns if c.endswith('_imputed')]
+    return ([c for c in afd.PROFILE_PASSTHROUGH_COLS if c in df.columns] + afd.PROFILE_AGGREGATE_COLS + imputed
+            + list(afd.GRADE_RULE_FLAGS.values()))
+
+def compare(pandas_df, sql_df):
+    """Returns a list of (school_id, column, pandas value, sql value) disagreements."""
+    if list(pandas_df['school_id'].astype(str)) != list(sql_df['school_id'].astype(str)):
+        raise RuntimeError("The two paths returned different schools.")
+
+    mismatches = []
+    for col in compared_columns(pandas_df):
+        left, right = pandas_df[col], sql_df[col]
+        if col in afd.PROFILE_PASSTHROUGH_COLS and col not in ('total_enrollment', 'completion_percentage'):
+            differs = left.astype('string').fillna('') != right.astype('string').fillna('')
+        else:
+            a = pd.to_numeric(left, errors='coerce').to_numpy(dtype=float)
+            b = pd.to_numeric(right, errors='coerce').to_numpy(dtype=float)
+            differs = pd.Series(~((a == b) | (np.isnan(a) & np.isnan(b))), index=left.index)
+            # What school_summary stores (to_int truncation) must agree too
+            if col in afd.PROFILE_AGGREGATE_COLS:
+                differs |= pd.Series(np.nan_to_num(a).astype(int) != np.nan_to_num(b).astype(int), index=left.index)
+        for i in np.flatnonzero(differs.to_numpy()):
+            mismatches.append((pandas_df['school_id'].iat[i], col, left.iat[i], right.iat[i]))
+    return mismatches
+
+def main():
+    parser = argparse.ArgumentParser(description='Check the SQL profile aggregation against the pandas path')
+    parser.add_argument('--sample', type=int, default=5000, help='school_profiles rows to sample')
+    parser.add_argument('--school_id', type=str, action='append', help='Check these schools (repeatable) instead of a sample')
+    args = parser.parse_args()
+
+    engine = get_engine(readonly=True)
+    school_ids = args.school_id
+    if not school_ids:
+        school_ids = copy_sql("SELECT school_id FROM school_profiles ORDER BY random() LIMIT %(n)s",
+                              {'n': args.sample}, readonly=True)['school_id'].astype(str).tolist()
+    if not school_ids:
+        print("school_profiles is empty.")
+        sys.exit(1)
+
+    pandas_df, sql_df = load_both(engine, school_ids)
+    columns = compared_columns(pandas_df)
+    mismatches = compare(pandas_df, sql_df)
+    print(f"{len(pandas_df)} schools x {len(columns)} columns ({len(pandas_df) * len(columns)} checks).")
+    if mismatches:
+        print(f"FAIL: {len(mismatches)} disagreement(s)")
+        for school_id, col, left, right in mismatches[:30]:
+            print(f"  {school_id} {col}: pandas {left!r}, sql {right!r}")
+        sys.exit(1)
+    print("PASS: the SQL pushdown reproduces the pandas aggregation on every sampled row.")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,192 @@
+
+import os
+import sys
+import math
+import json
+import shutil
+import argparse
+import subprocess
+import tempfile
+import pandas as pd
+from insighted_db import get_engine, copy_sql
+import advanced_fraud_detection as afd
+
+# Golden check for the offline scoring baseline: a sample of real school_summary
+# rows is scored by the pipeline (score_school_summary with the persisted stats)
+# and by the published bundle, through a plain-Python reference evaluator and,
+# when node is available, through src/utils/scoringBaseline.js itself. Every
+# flag the bundle covers must agree on every row. The bundle's `totals` recipe
+# (what the school profile form evaluates) is checked against aggregate_profiles
+# on sampled school_profiles rows the same way.
+
+JS_EVALUATOR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "src", "utils", "scoringBaseline.js")
+
+def bundle_flags(bundle):
+    return ([f'flag_outlier_{r}' for r in bundle['ratios']]
+            + [f'flag_anomaly_{m}' for m in bundle['anomalies']]
+            + list(bundle['zero_flags']) + ['flag_exp_mismatch'])
+
+def totals_of(row):
+    return {c: (0 if pd.isna(v) else int(v)) for c, v in row.items() if c.startswith('total_')}
+
+# Bundle total -> the aggregate_profiles column it mirrors
+AGGREGATE_COLUMNS = {
+    'total_learners': 'total_enrollment',
+    'total_teachers': 'num_teachers',
+    'total_teaching_experience': 'num_teachers_exp',
+    'total_classrooms': 'num_classrooms',
+    'total_seats': 'num_seats_granular',
+    'total_toilets': 'num_toilets',
+    'total_furniture': 'num_furniture',
+    'total_organized_classes': 'total_sections',
+    'total_school_resources': 'total_school_resources',
+}
+
+def profile_totals_reference(bundle, profile):
+    """Plain-Python statement of the totals recipe (profileTotals in the JS mirrors this)."""
+    def total(cols):
+        return sum(float(v) for v in (pd.to_numeric(profile.get(c), errors='coerce') for c in cols) if pd.notna(v))
+    return {name: max(total(cols) for cols in recipe['max_of']) + total(recipe['plus'])
+            for name, recipe in bundle['totals'].items()}
+
+def evaluate_reference(bundle, totals):
+    """Plain-Python statement of the bundle's rules (the JS evaluator mirrors this)."""
+    t = bundle['thresholds']
+    learners = totals.get('total_learners', 0)
+    flags = {}
+    for ratio, r in bundle['ratios'].items():
+        denominator = totals.get(r['denominator'], 0)
+        value = learners / denominator if denominator > 0 else 0
+        z = (math.log(value) - r['center']) / r['scale'] if value > 0 and r['scale'] and r['scale'] > 0 else None
+        flags[f'flag_outlier_{ratio}'] = z is not None and abs(z) > t['outlier_z']
+    for name, a in bundle['anomalies'].items():
+        actual = totals.get(a['metric'], 0)
+        valid = learners > 0 and actual > 0
+        z = None
+        if a['slope'] is not None and valid and a['residual_std'] and a['residual_std'] > 0:
+            z = (actual - learners * a['slope'] - a['residual_mean']) / a['residual_std']
+        flags[f'flag_anomaly_{name}'] = valid and z is not None and abs(z) > t['anomaly_z']
+    for flag, metric in bundle['zero_flags'].items():
+        flags[flag] = totals.get(metric, 0) == 0 and learners > 0
+    teachers = totals.get('total_teachers', 0)
+    flags['flag_exp_mismatch'] = teachers > 0 and totals.get('total_teaching_experience', 0) != teachers
+    return flags
+
+def evaluate_node(bundle_path, cases, call='evaluateScoringBaseline(baseline, c).flags'):
+    """Runs `call` from scoringBaseline.js over the cases; None when node is not installed."""
+    node = shutil.which('node')
+    if not node:
+        return None
+    with tempfile.NamedTemporaryFile('w', suffix='.json', delete=False, encoding='utf-8') as f:
+        json.dump(cases, f)
+        cases_path = f.name
+    script = (
+        "import { readFileSync } from 'node:fs';"
+        "import { pathToFileURL } from 'node:url';"
+        f"const {{ evaluateScoringBaseline, profileTotals }} = await import(pathToFileURL({json.dumps(JS_EVALUATOR)}).href);"
+        f"const baseline = JSON.parse(readFileSync({json.dumps(bundle_path)}, 'utf8'));"
+        f"const cases = JSON.parse(readFileSync({json.dumps(cases_path)}, 'utf8'));"
+        f"process.stdout.write(JSON.stringify(cases.map((c) => {call})));"
+    )
+    try:
+        out = subprocess.run([node, '--input-type=module', '-e', script], capture_output=True, text=True, check=True)
+        return json.loads(out.stdout)
+    except subprocess.CalledProcessError as e:
+        raise RuntimeError(f"node evaluator failed: {e.stderr.strip()}")
+    finally:
+        os.unlink(cases_path)
+
+def compare(bundle, bundle_path, scored_df, use_node=True):
+    """Returns a list of (school_id, flag, pipeline, evaluator, value) disagreements."""
+    flags = bundle_flags(bundle)
+    cases = [totals_of(row) for _, row in scored_df.iterrows()]
+    evaluators = {'python': [evaluate_reference(bundle, c) for c in cases]}
+    if use_node:
+        js = evaluate_node(bundle_path, cases)
+        if js is None:
+            print("node not found; checking the Python reference evaluator only.")
+        else:
+            evaluators['js'] = js
+
+    mismatches = []
+    for i, school_id in enumerate(scored_df['school_id'].astype(str)):
+        for flag in flags:
+            expected = bool(scored_df[flag].iat[i])
+            for name, results in evaluators.items():
+                if bool(results[i].get(flag)) != expected:
+                    mismatches.append((school_id, flag, expected, name, results[i].get(flag)))
+    return mismatches, list(evaluators)
+
+def compare_totals(bundle, bundle_path, profiles, use_node=True):
+    """Returns a list of (school_id, total, aggregate_profiles, evaluator, value) disagreements."""
+    aggregated = afd.aggregate_profiles(profiles.copy())
+    cases = [{c: (None if pd.isna(v) else v) for c, v in row.items()}
+             for row in profiles.astype(object).to_dict('records')]
+    evaluators = {'python': [profile_totals_reference(bundle, c) for c in cases]}
+    if use_node:
+        js = evaluate_node(bundle_path, cases, 'profileTotals(baseline, c)')
+        if js is not None:
+            evaluators['js'] = js
+
+    mismatches = []
+    for i, school_id in enumerate(profiles['school_id'].astype(str)):
+        for name, column in AGGREGATE_COLUMNS.items():
+            expected = pd.to_numeric(aggregated[column].iat[i], errors='coerce')
+            expected = 0.0 if pd.isna(expected) else float(expected)
+            for evaluator, results in evaluators.items():
+                if not math.isclose(results[i].get(name, math.nan), expected):
+                    mismatches.append((school_id, name, expected, evaluator, results[i].get(name)))
+    return mismatches
+
+def main():
+    parser = argparse.ArgumentParser(description='Check the offline scoring baseline against the pipeline on real rows')
+    parser.add_argument('--path', type=str, default=afd.BASELINE_PATH, help='Bundle to check')
+    parser.add_argument('--sample', type=int, default=2000, help='school_summary rows to sample')
+    parser.add_argument('--no-node', action='store_true', help='Skip the JavaScript evaluator')
+    args = parser.parse_args()
+
+    try:
+        with open(args.path, encoding='utf-8') as f:
+            bundle = json.load(f)
+    except (OSError, ValueError) as e:
+        print(f"Cannot read bundle {args.path}: {e}")
+        sys.exit(1)
+
+    engine = get_engine(readonly=True)
+    stats = afd.load_scoring_stats(engine)
+    if stats is None:
+        print("No persisted scoring statistics. Run a full batch first.")
+        sys.exit(1)
+    current = afd.build_scoring_baseline(stats)['version']
+    if current != bundle.get('version'):
+        print(f"Bundle version {bundle.get('version')} is stale (persisted stats give {current}); checking it anyway.")
+
+    sample = copy_sql("SELECT * FROM school_summary ORDER BY random() LIMIT %(n)s", {'n': args.sample}, readonly=True)
+    if sample.empty:
+        print("school_summary is empty.")
+        sys.exit(1)
+    # The pipeline's flags, recomputed with the stats the bundle was built from
+    scored, _ = afd.score_school_summary(sample, stats, verbose=False)
+
+    mismatches, evaluators = compare(bundle, args.path, scored, not args.no_node)
+    checked = len(scored) * len(bundle_flags(bundle))
+    print(f"Bundle {bundle.get('version')}: {len(scored)} rows x {len(bundle_flags(bundle))} flags "
+          f"({checked} checks) with {', '.join(evaluators)} evaluator(s).")
+    if mismatches:
+        print(f"FAIL: {len(mismatches)} disagreement(s)")
+        for school_id, flag, expected, name, got in mismatches[:30]:
+            print(f"  {school_id} {flag}: pipeline {expected}, {name} {got}")
+        sys.exit(1)
+    print("PASS: the bundle reproduces the pipeline's flags on every sampled row.")
+
+    profiles = copy_sql("SELECT * FROM school_profiles ORDER BY random() LIMIT %(n)s", {'n': args.sample}, readonly=True)
+    mismatches = compare_totals(bundle, args.path, profiles, not args.no_node)
+    if mismatches:
+        print(f"FAIL: {len(mismatches)} profile total disagreement(s)")
+        for school_id, name, expected, evaluator, got in mismatches[:30]:
+            print(f"  {school_id} {name}: aggregate_profiles {expected}, {evaluator} {got}")
+        sys.exit(1)
+    print(f"PASS: the totals recipe reproduces aggregate_profiles on {len(profiles)} sampled profiles.")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,56 @@
+"""
+Offline check of the teacher name matcher (no database): misspelled and
+reordered names in one school must pair up; different people must not.
+"""
+import sys
+
+import pandas as pd
+
+from teacher_dedupe import find_duplicates, prepare_teachers
+
+COLS = {'control_num': 'control_num', 'school_id': 'school_id', 'first': 'first',
+        'middle': 'middle', 'last': 'last', 'position': None, 'birth': None}
+
+# (first, last) vs (first, last), all in the same school
+SAME_PERSON = [
+    (('JUAN', 'DELA CRUZ'), ('JUAN', 'DELA KRUZ')),
+    (('JOSE', 'REYES'), ('JOSE', 'REYEZ')),
+    (('MARIA', 'SANTOS'), ('MARIA', 'SANTSO')),
+    (('ANA', 'GARCIA'), ('ANNA', 'GARCIA')),
+    (('PEDRO', 'BAUTISTA'), ('BAUTISTA', 'PEDRO')),
+    (('ROSARIO', 'MENDOZA'), ('MENDOZA', 'ROSARO')),
+]
+DIFFERENT_PEOPLE = [
+    (('MARK', 'LIM'), ('MARY', 'LIM')),
+    (('JOSE', 'REYES'), ('JOSE', 'REYNA')),
+    (('ANA', 'CRUZ'), ('ANA', 'RUIZ')),
+    (('JOHN', 'TAN'), ('JOAN', 'TAN')),
+    (('MARIA', 'SANTOS'), ('MARIA', 'SANTIAGO')),
+]
+
+
+def run_case(a, b):
+    raw = pd.DataFrame({
+        'control_num': ['A', 'B'], 'school_id': ['100001', '100001'],
+        'first': [a[0], b[0]], 'middle': ['', ''], 'last': [a[1], b[1]],
+    })
+    df, matches, _, _ = find_duplicates(prepare_teachers(raw, COLS))
+    return matches['similarity'].max() if len(matches) else None
+
+
+def main():
+    failures = 0
+    for expected, cases in ((True, SAME_PERSON), (False, DIFFERENT_PEOPLE)):
+        for a, b in cases:
+            similarity = run_case(a, b)
+            ok = (similarity is not None) == expected
+            failures += not ok
+            shown = f"{similarity:.2f}" if similarity is not None else "no match"
+            print(f"{'PASS' if ok else 'FAIL'}  {' '.join(a):<18} vs {' '.join(b):<18} "
+                  f"{shown:<9} (expected {'match' if expected else 'no match'})")
+    print(f"\n{failures} failure(s)")
+    return 1 if failures else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
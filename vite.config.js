@@ -18,7 +18,7 @@ export default defineConfig({
         type: 'module',
         navigateFallback: 'index.html',
       },
-      includeAssets: ['favicon.ico', 'apple-touch-icon.png', 'InsightEd1.png'],
+      includeAssets: ['favicon.ico', 'icons/apple-touch-icon.png', 'InsightEd1.png'],
       manifest: {
         name: 'InsightEd',
         short_name: 'InsightEd',
@@ -29,17 +29,30 @@ export default defineConfig({
         start_url: './',
         scope: './',
         icons: [
+          // Generated by scripts/resize_icons.py
           {
-            src: 'InsightED app.png', // Relative path
-            sizes: '192x192', // Ensure your file is high res enough
+            src: 'icons/pwa-192x192.png',
+            sizes: '192x192',
             type: 'image/png',
-            purpose: 'any maskable'
+            purpose: 'any'
           },
           {
-            src: 'InsightED app.png', // Relative path
+            src: 'icons/pwa-512x512.png',
             sizes: '512x512',
             type: 'image/png',
-            purpose: 'any maskable'
+            purpose: 'any'
+          },
+          {
+            src: 'icons/maskable-192x192.png',
+            sizes: '192x192',
+            type: 'image/png',
+            purpose: 'maskable'
+          },
+          {
+            src: 'icons/maskable-512x512.png',
+            sizes: '512x512',
+            type: 'image/png',
+            purpose: 'maskable'
           }
         ]
       },